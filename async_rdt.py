@@ -0,0 +1,218 @@
+import asyncio
+import math
+
+from congestion import CubicCongestionControl
+from rdt_layer import RDTLayer
+
+
+# #################################################################################################################### #
+# AsyncChannelPump                                                                                                     #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Moves segments through in-memory channels (UnreliableChannel and friends) on the event loop. Every interval it calls #
+# processData() on each channel, which is what rdt_main.py does once per iteration, and wakes the endpoint reading     #
+# from a channel as soon as segments are waiting for it.                                                               #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# One pump can serve any number of channels, so one event loop drives many transfers.                                  #
+#                                                                                                                      #
+# #################################################################################################################### #
+class AsyncChannelPump(object):
+    INTERVAL = 0.001 # in seconds
+
+    def __init__(self, interval=INTERVAL, loop=None):
+        self.interval = interval
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.channels = {}                              # channel -> endpoint reading from it (or None)
+        self.task = None
+
+    def attach(self, channel, endpoint=None):
+        if endpoint is not None or channel not in self.channels:
+            self.channels[channel] = endpoint
+        if self.task is None:
+            self.task = self.loop.create_task(self.run())
+
+    def detach(self, channel):
+        self.channels.pop(channel, None)
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            for channel, endpoint in list(self.channels.items()):
+                channel.processData()
+                if endpoint is not None and getattr(channel, 'receiveQueue', None):
+                    endpoint.step()
+            await asyncio.sleep(self.interval)
+
+
+# #################################################################################################################### #
+# AsyncRDTLayer                                                                                                        #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# asyncio front end for RDTLayer. The layer runs on the event loop clock (ticks of tickSeconds) instead of lockstep    #
+# iterations: it is stepped whenever segments arrive, when the application sends, and when the earliest                #
+# retransmission deadline of its timer wheel comes due, scheduled with loop.call_at().                                 #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Channels with a fileno() (UdpChannel) are watched with loop.add_reader(). In-memory channels need an                 #
+# AsyncChannelPump. Extra keyword arguments go to RDTLayer; the timeouts default to wall-clock values in seconds.      #
+# shutdown() closes the sending side with a FIN and waits for the peer's FIN-ACK; receive() returns empty data once    #
+# the peer has closed and everything it sent was returned.                                                             #
+#                                                                                                                      #
+# #################################################################################################################### #
+class AsyncRDTLayer(object):
+    TICK_SECONDS = 0.001                                # Resolution of the layer clock
+    INITIAL_TIMEOUT = 0.2 # in seconds
+    MIN_TIMEOUT = 0.005 # in seconds
+    MAX_TIMEOUT = 2.0 # in seconds
+
+    def __init__(self, sendChannel, receiveChannel=None, pump=None, tickSeconds=TICK_SECONDS, loop=None,
+                 **layerOptions):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.tickSeconds = tickSeconds
+        self.pump = pump
+        receiveChannel = receiveChannel if receiveChannel is not None else sendChannel
+
+        layerOptions.setdefault('initialTimeout', math.ceil(AsyncRDTLayer.INITIAL_TIMEOUT / tickSeconds))
+        layerOptions.setdefault('minTimeout', math.ceil(AsyncRDTLayer.MIN_TIMEOUT / tickSeconds))
+        layerOptions.setdefault('maxTimeout', math.ceil(AsyncRDTLayer.MAX_TIMEOUT / tickSeconds))
+        layerOptions.setdefault('congestionControl', CubicCongestionControl(timeScale=1 / tickSeconds))
+        self.layer = RDTLayer(clock=self.now, **layerOptions)
+        self.layer.setSendChannel(sendChannel)
+        self.layer.setReceiveChannel(receiveChannel)
+
+        self.timerHandle = None
+        self.sendWaiters = []                           # (end offset, future) of pending send() calls
+        self.receiveWaiter = None
+        self.delivered = 0                              # received data already returned by receive()
+        self.completion = {'send': self.loop.create_future(), 'receive': self.loop.create_future()}
+        self.layer.setCompletionCallback(self.onComplete)
+
+        self.readerFd = None
+        if hasattr(receiveChannel, 'fileno'):
+            self.readerFd = receiveChannel.fileno()
+            self.loop.add_reader(self.readerFd, self.step)
+        elif pump is None:
+            raise ValueError("An in-memory channel needs an AsyncChannelPump")
+        if pump is not None:
+            pump.attach(receiveChannel, None if self.readerFd is not None else self)
+            if sendChannel is not receiveChannel:
+                pump.attach(sendChannel)
+
+    def now(self):
+        return int(self.loop.time() / self.tickSeconds)
+
+    async def send(self, data):
+        """
+        Queues data behind anything sent before and returns once all of it
+        has been acknowledged.
+        """
+        layer = self.layer
+        layer.write(data)
+        waiter = self.loop.create_future()
+        # a compressed stream is flushed here so the end offset of this write is known
+        end = layer.source.available(math.inf) if layer.source is not None else len(layer.dataToSend)
+        self.sendWaiters.append((end, waiter))
+        self.step()
+        await waiter
+
+    async def receive(self):
+        """
+        Waits for in-order data that has not been returned yet and returns
+        it (a memoryview for binary transfers). Returns empty data at the end
+        of the peer's stream.
+        """
+        while self.getReceivedLength() <= self.delivered and not self.layer.isReceiveComplete():
+            self.receiveWaiter = self.loop.create_future()
+            await self.receiveWaiter
+        data = self.layer.getDataReceived()[self.delivered:]
+        self.delivered += len(data)
+        return data
+
+    def getReceivedLength(self):
+        return self.layer.getReceivedLength()
+
+    async def shutdown(self):
+        """
+        Closes the sending side and returns once the peer has acknowledged
+        the FIN, and with it everything sent before. Raises ConnectionError
+        if the peer never does.
+        """
+        self.layer.close()
+        self.step()
+        await self.completion['send']
+
+    async def waitClosed(self):
+        """
+        Returns once both sides have closed and all data has arrived.
+        """
+        await asyncio.gather(self.completion['send'], self.completion['receive'])
+
+    def onComplete(self, direction):
+        if direction == 'abort':
+            if not self.completion['send'].done():
+                self.completion['send'].set_exception(ConnectionError("The peer did not acknowledge the FIN"))
+            return
+        if not self.completion[direction].done():
+            self.completion[direction].set_result(None)
+
+    def step(self):
+        """
+        Runs the layer once at the current time: ACKs and data that arrived,
+        due retransmissions, then new sends the opened window allows.
+        """
+        layer = self.layer
+        layer.tick()
+        layer.processReceiveAndSendRespond()
+        layer.processSend()
+        if layer.tracer.sampling:
+            layer.tracer.sample(layer)
+        self.notify()
+        self.armTimer()
+
+    def notify(self):
+        if self.sendWaiters:
+            acked = self.layer.getSendBase()
+            while self.sendWaiters and self.sendWaiters[0][0] <= acked:
+                end, waiter = self.sendWaiters.pop(0)
+                if not waiter.done():
+                    waiter.set_result(None)
+        if self.receiveWaiter is not None and (self.getReceivedLength() > self.delivered
+                                               or self.layer.isReceiveComplete()):
+            if not self.receiveWaiter.done():
+                self.receiveWaiter.set_result(None)
+            self.receiveWaiter = None
+
+    def armTimer(self):
+        deadline = self.layer.getNextTimerDeadline()
+        if deadline is None:
+            if self.timerHandle is not None:
+                self.timerHandle.cancel()
+                self.timerHandle = None
+            return
+        # half a tick late so now() has reached the deadline when the callback runs
+        when = (deadline + 0.5) * self.tickSeconds
+        if self.timerHandle is not None:
+            if self.timerHandle.when() == when:
+                return
+            self.timerHandle.cancel()
+        self.timerHandle = self.loop.call_at(when, self.onTimer)
+
+    def onTimer(self):
+        self.timerHandle = None
+        self.step()
+
+    def close(self):
+        if self.readerFd is not None:
+            self.loop.remove_reader(self.readerFd)
+            self.readerFd = None
+        if self.timerHandle is not None:
+            self.timerHandle.cancel()
+            self.timerHandle = None
+        if self.pump is not None:
+            self.pump.detach(self.layer.receiveChannel)
+            self.pump.detach(self.layer.sendChannel)
@@ -0,0 +1,93 @@
+from collections import deque
+
+from unreliable import UnreliableChannel
+
+try:
+    import numpy as np
+except ImportError:                                     # optional: only this channel needs NumPy
+    np = None
+
+
+# #################################################################################################################### #
+# BatchUnreliableChannel                                                                                               #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# UnreliableChannel with the impairment decisions drawn for the whole sendQueue at once. One NumPy draw per iteration  #
+# gives the delay/drop/corrupt masks, delayed packets wait in a deque ordered by release iteration, and the statistics #
+# counters are updated from the masks with the same meaning as in UnreliableChannel.                                   #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Pass seed (or a numpy Generator as rng) to make runs reproducible. The position of a checksum error is still chosen  #
+# by the segment's createChecksumError(), which uses the random module, so seed that as well for identical payloads.   #
+# Needs the numpy package (pip install numpy), which nothing else in the repository uses; without it the module still  #
+# imports but creating a channel raises ValueError.                                                                    #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class BatchUnreliableChannel(UnreliableChannel):
+
+    def __init__(self, canDeliverOutOfOrder_, canDropPackets_, canDelayPackets_, canHaveChecksumErrors_,
+                 seed=None, rng=None, **impairment):
+        if np is None:
+            raise ValueError("BatchUnreliableChannel needs the numpy package")
+        super().__init__(canDeliverOutOfOrder_, canDropPackets_, canDelayPackets_, canHaveChecksumErrors_,
+                         **impairment)
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        self.delayedPackets = deque()                   # (release iteration, segment), oldest first
+
+    def processData(self):
+        self.currentIteration += 1
+
+        # like UnreliableChannel, nothing moves (delayed packets included) on an iteration without new packets
+        if len(self.sendQueue) == 0:
+            return
+
+        if self.canDeliverOutOfOrder:
+            if self.rng.random() <= self.ratioOutOfOrderPackets:
+                self.countOutOfOrderPackets += 1
+                self.sendQueue.reverse()
+
+        # add in delayed packets, every packet waits the same number of iterations so the deque stays ordered
+        while self.delayedPackets and self.delayedPackets[0][0] <= self.currentIteration:
+            self.countSentPackets += 1
+            self.receiveQueue.append(self.delayedPackets.popleft()[1])
+
+        queue = self.sendQueue
+        count = len(queue)
+        draws = self.rng.random((3, count))
+        isData = np.fromiter((seg.acknum == -1 or len(seg.payload) > 0 for seg in queue), dtype=bool, count=count)
+
+        if self.canDelayPackets:
+            delayed = draws[0] <= self.ratioDelayedPackets
+        else:
+            delayed = np.zeros(count, dtype=bool)
+        passed = ~delayed
+        if self.canDropPackets:
+            delivered = passed & (draws[1] > self.ratioDroppedPackets)
+        else:
+            delivered = passed
+        # only data packets can have checksum errors, dropped ones included
+        if self.canHaveChecksumErrors:
+            corrupted = passed & isData & (draws[2] <= self.ratioDataErrorPackets)
+        else:
+            corrupted = np.zeros(count, dtype=bool)
+
+        self.countDelayedPackets += int(np.count_nonzero(delayed))
+        self.countDroppedPackets += int(np.count_nonzero(passed & ~delivered))
+        self.countSentPackets += int(np.count_nonzero(delivered))
+        self.countTotalDataPackets += int(np.count_nonzero(passed & isData))
+        self.countAckPackets += int(np.count_nonzero(passed & ~isData))
+        self.countChecksumErrorPackets += int(np.count_nonzero(corrupted))
+
+        for i in np.flatnonzero(corrupted):
+            queue[i].createChecksumError()
+
+        release = self.currentIteration + self.iterationsToDelayPackets
+        for i in np.flatnonzero(delayed):
+            seg = queue[i]
+            seg.setStartDelayIteration(self.currentIteration)
+            self.delayedPackets.append((release, seg))
+
+        self.receiveQueue.extend(queue[i] for i in np.flatnonzero(delivered))
+        self.sendQueue.clear()
@@ -0,0 +1,233 @@
+import random
+import struct
+import zlib
+
+
+# #################################################################################################################### #
+# CompactSegment                                                                                                       #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Drop-in alternative to Segment with a fixed binary header and a CRC-32 checksum. The checksum is computed over the   #
+# packed header and the raw payload buffer, so no formatted string is built per segment, and it catches reordered      #
+# characters that the character sum of Segment misses. encode()/decode() turn a segment into wire bytes and back.      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Wire layout (network byte order):                                                                                    #
+#   conn id I | seqnum q | acknum q | window i | flags B | sack count B | payload length I | crc32 I |                 #
+#   sack blocks (q q)* | payload                                                                                       #
+# A str payload is sent as UTF-8 with the TEXT flag set and comes back as str.                                         #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class CompactSegment(object):
+    __slots__ = ('seqnum', 'acknum', 'payload', 'checksum', 'sackBlocks', 'window', 'connId', 'repair',
+                 'compressed', 'fin', 'wireFlags', 'startIteration', 'startDelayIteration')
+
+    FLAG_TEXT = 0x01
+    FLAG_REPAIR = 0x02                                  # forward error correction parity, see fec.py
+    FLAG_COMPRESSED = 0x04                              # payload is part of a compressed stream, see compression.py
+    FLAG_FIN = 0x08                                     # end of the sender's data (seqnum) or its acknowledgment
+    KNOWN_FLAGS = FLAG_TEXT | FLAG_REPAIR | FLAG_COMPRESSED | FLAG_FIN
+    PREFIX = struct.Struct('!IqqiBBI')                  # header fields covered by the checksum
+    HEADER = struct.Struct('!IqqiBBII')                 # PREFIX followed by the checksum itself
+    SACK_BLOCK = struct.Struct('!qq')
+
+    def __init__(self):
+        self.seqnum = -1
+        self.acknum = -1
+        self.payload = ''
+        self.checksum = 0
+        self.sackBlocks = ()
+        self.window = -1
+        self.connId = 0
+        self.repair = False
+        self.compressed = False
+        self.fin = False
+        self.wireFlags = 0                              # received flag bits the fields above do not describe
+        self.startIteration = 0
+        self.startDelayIteration = 0
+
+    @classmethod
+    def fromSegment(cls, seg):
+        """
+        Returns a CompactSegment with the fields of any segment object. The
+        checksum is recomputed, so convert segments before they travel.
+        """
+        compact = cls()
+        compact.seqnum = seg.seqnum
+        compact.acknum = seg.acknum
+        compact.payload = seg.payload
+        compact.sackBlocks = tuple(seg.sackBlocks)
+        compact.window = seg.window
+        compact.connId = seg.connId
+        compact.repair = getattr(seg, 'repair', False)
+        compact.compressed = getattr(seg, 'compressed', False)
+        compact.fin = getattr(seg, 'fin', False)
+        compact.checksum = compact.compute_checksum()
+        return compact
+
+    def setData(self, seq, data, ack=-1, sackBlocks=(), window=-1):
+        self.seqnum = seq
+        self.acknum = ack
+        self.payload = data
+        self.sackBlocks = tuple(sackBlocks)
+        self.window = window
+        self.repair = False
+        self.checksum = self.compute_checksum()
+
+    def setRepair(self, seq, data):
+        self.seqnum = seq
+        self.acknum = -1
+        self.payload = data
+        self.sackBlocks = ()
+        self.window = -1
+        self.repair = True
+        self.checksum = self.compute_checksum()
+
+    def setAck(self, ack, sackBlocks=(), window=-1):
+        self.seqnum = -1
+        self.acknum = ack
+        self.payload = ''
+        self.sackBlocks = tuple(sackBlocks)
+        self.window = window
+        self.repair = False
+        self.checksum = self.compute_checksum()
+
+    def setStartIteration(self, iteration):
+        self.startIteration = iteration
+
+    def getStartIteration(self):
+        return self.startIteration
+
+    def setStartDelayIteration(self, iteration):
+        self.startDelayIteration = iteration
+
+    def getStartDelayIteration(self):
+        return self.startDelayIteration
+
+    def to_string(self):
+        data = self.payload if isinstance(self.payload, str) else "<{0} bytes>".format(len(self.payload))
+        text = "seq: {0}, ack: {1}, data: {2}".format(self.seqnum, self.acknum, data)
+        if self.sackBlocks:
+            text += ", sack: {0}".format(self.sackBlocks)
+        if self.window >= 0:
+            text += ", win: {0}".format(self.window)
+        if self.connId:
+            text += ", conn: {0}".format(self.connId)
+        if self.repair:
+            text += ", repair"
+        if self.compressed:
+            text += ", compressed"
+        if self.fin:
+            text += ", fin"
+        return text
+
+    def printToConsole(self):
+        print(self.to_string())
+
+    def checkChecksum(self):
+        return self.compute_checksum() == self.checksum
+
+    def compute_checksum(self):
+        payload, flags = self.getWirePayload()
+        crc = zlib.crc32(CompactSegment.PREFIX.pack(self.connId, self.seqnum, self.acknum, self.window, flags,
+                                                    len(self.sackBlocks), len(payload)))
+        for left, right in self.sackBlocks:
+            crc = zlib.crc32(CompactSegment.SACK_BLOCK.pack(left, right), crc)
+        return zlib.crc32(payload, crc)
+
+    def getWirePayload(self):
+        """
+        Returns the payload as a bytes-like object and the header flags that
+        describe it.
+        """
+        flags = self.wireFlags
+        if self.repair:
+            flags |= CompactSegment.FLAG_REPAIR
+        if self.compressed:
+            flags |= CompactSegment.FLAG_COMPRESSED
+        if self.fin:
+            flags |= CompactSegment.FLAG_FIN
+        if isinstance(self.payload, str):
+            return self.payload.encode('utf-8', 'surrogatepass'), flags | CompactSegment.FLAG_TEXT
+        return self.payload, flags
+
+    def getEncodedSize(self, payload=None):
+        """
+        Returns the number of bytes encode() produces.
+        """
+        if payload is None:
+            payload = self.getWirePayload()[0]
+        return CompactSegment.HEADER.size + len(self.sackBlocks) * CompactSegment.SACK_BLOCK.size + len(payload)
+
+    def encode(self) -> bytearray:
+        """
+        Returns the segment serialized for the wire.
+        """
+        payload = self.getWirePayload()[0]
+        buffer = bytearray(self.getEncodedSize(payload))
+        self.encodeInto(buffer)
+        return buffer
+
+    def encodeInto(self, buffer, offset=0) -> int:
+        """
+        Serializes the segment into a writable buffer at offset, so senders
+        can reuse one buffer. Returns the number of bytes written.
+        """
+        payload, flags = self.getWirePayload()
+        CompactSegment.HEADER.pack_into(buffer, offset, self.connId, self.seqnum, self.acknum, self.window, flags,
+                                        len(self.sackBlocks), len(payload), self.checksum)
+        position = offset + CompactSegment.HEADER.size
+        for left, right in self.sackBlocks:
+            CompactSegment.SACK_BLOCK.pack_into(buffer, position, left, right)
+            position += CompactSegment.SACK_BLOCK.size
+        buffer[position:position + len(payload)] = payload
+        return position + len(payload) - offset
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Returns the segment serialized in a bytes-like object. The checksum
+        is taken from the wire and is not verified here: flag bits and text
+        that cannot be read are kept as they came, so checkChecksum() fails.
+        Raises struct.error or ValueError if the data is shorter than its
+        header says.
+        """
+        view = memoryview(data)
+        seg = cls()
+        seg.connId, seg.seqnum, seg.acknum, seg.window, flags, sackCount, length, seg.checksum = \
+            CompactSegment.HEADER.unpack_from(view)
+        position = CompactSegment.HEADER.size
+        blocks = []
+        for i in range(sackCount):
+            blocks.append(CompactSegment.SACK_BLOCK.unpack_from(view, position))
+            position += CompactSegment.SACK_BLOCK.size
+        seg.sackBlocks = tuple(blocks)
+        seg.repair = bool(flags & CompactSegment.FLAG_REPAIR)
+        seg.compressed = bool(flags & CompactSegment.FLAG_COMPRESSED)
+        seg.fin = bool(flags & CompactSegment.FLAG_FIN)
+        seg.wireFlags = flags & ~CompactSegment.KNOWN_FLAGS
+        if position + length > len(view):
+            raise ValueError("Segment payload runs past the end of the data")
+        payload = view[position:position + length]
+        if flags & CompactSegment.FLAG_TEXT:
+            try:
+                seg.payload = str(payload, 'utf-8', 'surrogatepass')
+            except UnicodeDecodeError:
+                seg.payload = bytes(payload)
+                seg.wireFlags |= CompactSegment.FLAG_TEXT
+        else:
+            seg.payload = bytes(payload)
+        return seg
+
+    # Same corruption model as Segment.createChecksumError, used by UnreliableChannel
+    def createChecksumError(self):
+        if not self.payload:
+            return
+        if isinstance(self.payload, str):
+            char = random.choice(self.payload)
+            self.payload = self.payload.replace(char, 'X', 1)
+        else:
+            byte = random.choice(self.payload)
+            self.payload = bytes(self.payload).replace(bytes([byte]), b'X', 1)
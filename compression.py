@@ -0,0 +1,215 @@
+import codecs
+import time
+import zlib
+from collections import deque
+
+from streaming import StreamSource
+
+try:
+    import zstandard
+except ImportError:                                     # zstd is optional, zlib is always there
+    zstandard = None
+
+
+# #################################################################################################################### #
+# Compression                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Optional payload compression for RDTLayer. The sender compresses its data as one incremental stream and segments the #
+# compressed bytes; the receiver decompresses each in-order payload as it is delivered. Sequence numbers, windows and  #
+# SACK blocks all count compressed bytes, getReceivedLength() counts the application data.                             #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# The compressed stream starts with a two byte preamble naming the method and whether the data is text (UTF-8 encoded  #
+# before compression) or bytes, so the receiver needs no configuration: segments of a compressed stream carry the      #
+# compressed flag and the preamble tells the rest. zstd needs the zstandard package.                                   #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+ZLIB = 'zlib'
+ZSTD = 'zstd'
+METHOD_CODES = {ZLIB: b'z', ZSTD: b's'}
+TEXT = b't'
+BINARY = b'b'
+PREAMBLE_SIZE = 2 # in bytes                            # method code, TEXT or BINARY
+DEFAULT_LEVEL = 6
+
+
+class StreamCompressor(object):
+
+    def __init__(self, method=ZLIB, level=DEFAULT_LEVEL):
+        if method not in METHOD_CODES:
+            raise ValueError("Unknown compression method: {0}".format(method))
+        if method == ZSTD and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.method = method
+        self.level = level
+        self.compressor = None                          # created with the preamble, once the data type is known
+        self.rawLength = 0                              # application characters (or bytes) taken in
+        self.compressedLength = 0
+        self.cpuTime = 0.0                              # process time spent compressing, in seconds
+
+    def start(self, text) -> bytes:
+        if self.method == ZSTD:
+            self.compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        else:
+            self.compressor = zlib.compressobj(self.level)
+        return METHOD_CODES[self.method] + (TEXT if text else BINARY)
+
+    def compress(self, data) -> bytes:
+        """
+        Returns the compressed bytes for the next piece of the stream, which
+        may be empty while the compressor buffers.
+        """
+        began = time.process_time()
+        output = b'' if self.compressor is not None else self.start(isinstance(data, str))
+        self.rawLength += len(data)
+        if isinstance(data, str):
+            data = data.encode('utf-8', 'surrogatepass')
+        output += self.compressor.compress(data)
+        self.compressedLength += len(output)
+        self.cpuTime += time.process_time() - began
+        return output
+
+    def flush(self, finish) -> bytes:
+        """
+        Returns everything the compressor holds. finish ends the stream,
+        otherwise the output stays open for more data (a sync flush).
+        """
+        began = time.process_time()
+        output = b'' if self.compressor is not None else self.start(False)
+        if self.method == ZSTD:
+            output += self.compressor.flush() if finish else self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            output += self.compressor.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
+        self.compressedLength += len(output)
+        self.cpuTime += time.process_time() - began
+        return output
+
+    def getRatio(self) -> float:
+        """
+        Returns application data over compressed data, 0.0 before any output.
+        """
+        return self.rawLength / self.compressedLength if self.compressedLength else 0.0
+
+
+class StreamDecompressor(object):
+
+    def __init__(self):
+        self.preamble = b''
+        self.decompressor = None
+        self.decoder = None                             # incremental UTF-8 decoder of a text stream
+        self.rawLength = 0
+        self.compressedLength = 0
+        self.cpuTime = 0.0
+
+    def decompress(self, payload):
+        """
+        Returns the application data in the next in-order piece of the
+        stream: str for a text stream, bytes otherwise, None while the
+        preamble is incomplete.
+        """
+        began = time.process_time()
+        self.compressedLength += len(payload)
+        data = bytes(payload)
+        if self.decompressor is None:
+            data = self.preamble + data
+            if len(data) < PREAMBLE_SIZE:
+                self.preamble = data
+                return None
+            method, mode = data[:1], data[1:PREAMBLE_SIZE]
+            data = data[PREAMBLE_SIZE:]
+            if method == METHOD_CODES[ZSTD]:
+                if zstandard is None:
+                    raise ValueError("Received a zstd stream, which needs the zstandard package")
+                self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+            else:
+                self.decompressor = zlib.decompressobj()
+            if mode == TEXT:
+                self.decoder = codecs.getincrementaldecoder('utf-8')('surrogatepass')
+        output = self.decompressor.decompress(data)
+        if self.decoder is not None:
+            output = self.decoder.decode(output)
+        self.rawLength += len(output)
+        self.cpuTime += time.process_time() - began
+        return output
+
+    def getRatio(self) -> float:
+        return self.rawLength / self.compressedLength if self.compressedLength else 0.0
+
+
+def readSource(source, chunkSize):
+    """
+    Yields the data of a StreamSource-like object in slices of at most
+    chunkSize, releasing each one once it has been taken.
+    """
+    begin = 0
+    while True:
+        end = min(source.available(begin + chunkSize), begin + chunkSize)
+        if end <= begin:
+            return
+        yield source.slice(begin, end)
+        source.release(end)
+        begin = end
+
+
+# #################################################################################################################### #
+# CompressedSource                                                                                                     #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# StreamSource whose bytes are the compressed form of another source: an iterator of chunks, a file-like object, or    #
+# data handed to append() when the layer sends from write(). Input is compressed one chunk at a time as the send       #
+# window reaches it, so neither the whole input nor the whole compressed stream is held in memory.                     #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# A source with available()/slice() (StreamSource, MappedFileSource) and str or bytes-like data are read in chunkSize  #
+# slices. Appended data is sync-flushed once the window has caught up with it, so written data goes out without        #
+# waiting for more writes. A source from append() stays open; any other ends the stream when its input runs out.       #
+#                                                                                                                      #
+# #################################################################################################################### #
+class CompressedSource(StreamSource):
+
+    def __init__(self, source=None, method=ZLIB, level=DEFAULT_LEVEL, chunkSize=StreamSource.CHUNK_SIZE):
+        if hasattr(source, 'available'):
+            source = readSource(source, chunkSize)
+        elif isinstance(source, (str, bytes, bytearray, memoryview)):
+            data = source
+            source = (data[begin:begin + chunkSize] for begin in range(0, len(data), chunkSize))
+        super().__init__(() if source is None else source, chunkSize)
+        self.compressor = StreamCompressor(method, level)
+        self.open = source is None                      # fed by append(), more data may always follow
+        self.pending = deque()
+        self.flushed = True
+
+    def append(self, data) -> None:
+        self.pending.append(data)
+
+    def available(self, upTo) -> int:
+        """
+        Compresses input until compressed data up to offset upTo is buffered
+        or the input runs dry. Returns the end offset of the buffered data.
+        """
+        while not self.eof and self.end < upTo:
+            if self.pending:
+                chunk = self.pending.popleft()
+            elif not self.open:
+                chunk = next(self.chunks, None)
+            else:
+                chunk = None
+            if chunk is not None:
+                output = self.compressor.compress(chunk)
+                self.flushed = False
+            elif self.open:
+                if self.flushed:
+                    break
+                output = self.compressor.flush(False)
+                self.flushed = True
+            else:
+                output = self.compressor.flush(True)
+                self.eof = True
+            if output:
+                if self.buffer is None:
+                    self.buffer = bytearray()
+                self.buffer += output
+                self.end += len(output)
+        return self.end
@@ -0,0 +1,188 @@
+import abc
+import math
+
+
+# #################################################################################################################### #
+# Congestion Control                                                                                                   #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Pluggable congestion control engines for the RDTLayer sender. Every engine keeps a congestion window (cwnd) measured #
+# in segments and is told about newly acknowledged segments, fast retransmits and timeouts. Time is whatever clock the #
+# RDTLayer runs on (iterations by default).                                                                            #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Use createCongestionControl() with a name from CONGESTION_CONTROLS or pass an instance of a CongestionControl        #
+# subclass straight to RDTLayer. A subclass that does not implement onAck(), onLoss() and onTimeout() cannot be        #
+# created.                                                                                                             #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class CongestionControl(abc.ABC):
+    INITIAL_WINDOW = 4 # in segments                    # cwnd at the start of a transfer
+    MIN_WINDOW = 2 # in segments                        # ssthresh never drops below this
+    MAX_WINDOW = 65536 # in segments                    # cwnd never grows above this
+
+    def __init__(self, initialWindow=INITIAL_WINDOW):
+        self.cwnd = initialWindow
+        self.ssthresh = CongestionControl.MAX_WINDOW
+
+    def getWindow(self) -> int:
+        """
+        Returns the number of segments that may be in flight.
+        """
+        return max(1, int(self.cwnd))
+
+    @abc.abstractmethod
+    def onAck(self, ackedSegments, now) -> None:
+        """
+        Called with the number of segments released by one ACK. Returns None.
+        """
+
+    @abc.abstractmethod
+    def onLoss(self, inFlight, now) -> None:
+        """
+        Called when duplicate ACKs signal a lost segment. Returns None.
+        """
+
+    @abc.abstractmethod
+    def onTimeout(self, inFlight, now) -> None:
+        """
+        Called when a retransmission timer runs out. Returns None.
+        """
+
+
+# #################################################################################################################### #
+# FixedWindow                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# The original behaviour: a constant window that never reacts to the network. RDTLayer sizes it from its               #
+# FLOW_CONTROL_WIN_SIZE and segment size.                                                                              #
+#                                                                                                                      #
+# #################################################################################################################### #
+class FixedWindow(CongestionControl):
+    WINDOW = 3 # in segments                            # FLOW_CONTROL_WIN_SIZE // DATA_LENGTH of the original layer
+
+    def __init__(self, window=WINDOW):
+        super().__init__(window)
+
+    def onAck(self, ackedSegments, now) -> None:
+        pass
+
+    def onLoss(self, inFlight, now) -> None:
+        pass
+
+    def onTimeout(self, inFlight, now) -> None:
+        pass
+
+
+# #################################################################################################################### #
+# RenoCongestionControl                                                                                                #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# AIMD with slow start and congestion avoidance. A fast retransmit halves the window, a timeout collapses it to one    #
+# segment and restarts slow start.                                                                                     #
+#                                                                                                                      #
+# #################################################################################################################### #
+class RenoCongestionControl(CongestionControl):
+
+    def onAck(self, ackedSegments, now) -> None:
+        if self.cwnd < self.ssthresh:
+            self.cwnd += ackedSegments                              # slow start
+        else:
+            self.cwnd += ackedSegments / self.cwnd                  # congestion avoidance
+        self.cwnd = min(self.cwnd, CongestionControl.MAX_WINDOW)
+
+    def onLoss(self, inFlight, now) -> None:
+        self.ssthresh = max(inFlight / 2, CongestionControl.MIN_WINDOW)
+        self.cwnd = self.ssthresh
+
+    def onTimeout(self, inFlight, now) -> None:
+        self.ssthresh = max(inFlight / 2, CongestionControl.MIN_WINDOW)
+        self.cwnd = 1
+
+
+# #################################################################################################################### #
+# CubicCongestionControl                                                                                               #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# CUBIC window growth (RFC 8312) with fast convergence and the TCP-friendly region. The cubic function is evaluated in #
+# the RDTLayer clock units divided by timeScale, so C is per iteration by default; pass the clock's ticks per second   #
+# as timeScale to get the per-second C of the RFC on a wall clock.                                                     #
+#                                                                                                                      #
+# #################################################################################################################### #
+class CubicCongestionControl(CongestionControl):
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, initialWindow=CongestionControl.INITIAL_WINDOW, timeScale=1):
+        super().__init__(initialWindow)
+        self.timeScale = timeScale
+        self.wMax = 0
+        self.k = 0
+        self.epochStart = None
+        self.wEst = 0
+
+    def onAck(self, ackedSegments, now) -> None:
+        if self.cwnd < self.ssthresh:
+            self.cwnd += ackedSegments
+        else:
+            if self.epochStart is None:
+                # first ACK of a new congestion avoidance epoch
+                self.epochStart = now
+                if self.cwnd < self.wMax:
+                    self.k = math.pow((self.wMax - self.cwnd) / CubicCongestionControl.C, 1 / 3)
+                else:
+                    self.k = 0
+                    self.wMax = self.cwnd
+                self.wEst = self.cwnd
+            t = (now - self.epochStart) / self.timeScale
+            target = CubicCongestionControl.C * math.pow(t - self.k, 3) + self.wMax
+            beta = CubicCongestionControl.BETA
+            self.wEst += 3 * (1 - beta) / (1 + beta) * ackedSegments / self.cwnd
+            if target > self.cwnd:
+                self.cwnd += (target - self.cwnd) / self.cwnd * ackedSegments
+            else:
+                self.cwnd += 0.01 * ackedSegments / self.cwnd
+            self.cwnd = max(self.cwnd, self.wEst)
+        self.cwnd = min(self.cwnd, CongestionControl.MAX_WINDOW)
+
+    def onLoss(self, inFlight, now) -> None:
+        self.reduce()
+        self.cwnd = self.ssthresh
+
+    def onTimeout(self, inFlight, now) -> None:
+        self.reduce()
+        self.cwnd = 1
+
+    def reduce(self) -> None:
+        """
+        Remembers the window the loss happened at and applies the
+        multiplicative decrease to ssthresh. Returns None.
+        """
+        beta = CubicCongestionControl.BETA
+        if self.cwnd < self.wMax:
+            self.wMax = self.cwnd * (1 + beta) / 2                  # fast convergence
+        else:
+            self.wMax = self.cwnd
+        self.ssthresh = max(self.cwnd * beta, CongestionControl.MIN_WINDOW)
+        self.epochStart = None
+
+
+CONGESTION_CONTROLS = {
+    'fixed': FixedWindow,
+    'reno': RenoCongestionControl,
+    'cubic': CubicCongestionControl,
+}
+
+
+def createCongestionControl(congestionControl) -> CongestionControl:
+    """
+    Returns a congestion control engine for a name in CONGESTION_CONTROLS,
+    or the given object unchanged if it already is an engine.
+    """
+    if isinstance(congestionControl, CongestionControl):
+        return congestionControl
+    if congestionControl not in CONGESTION_CONTROLS:
+        raise ValueError("Unknown congestion control: {0}".format(congestionControl))
+    return CONGESTION_CONTROLS[congestionControl]()
@@ -0,0 +1,165 @@
+import struct
+from collections import deque
+
+
+# #################################################################################################################### #
+# Forward Error Correction                                                                                             #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# XOR parity for RDTLayer. The sender folds every new data segment into the parity of its current block and, once the  #
+# block holds blockSize segments, sends a repair segment carrying the parity and the segment lengths. A receiver       #
+# missing exactly one segment of a block rebuilds it from the repair and the other segments, without waiting for a     #
+# retransmission.                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Repair payloads are bytes: the block's segment lengths followed by the parity. A text block is XORed over the UTF-8  #
+# encoding of its segments, and its repair also carries the encoded lengths. The parity is kept as a Python int, so    #
+# folding a segment in is one big-integer XOR. With adaptive set the block size follows the loss rate the sender       #
+# observes through its retransmissions.                                                                                #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+REPAIR_HEADER = struct.Struct('!BH')                    # text flag, number of segments in the block
+LENGTH_SIZE = 4 # in bytes                              # One segment length in a repair payload
+
+
+def encodePayload(payload):
+    """
+    Returns the bytes a payload contributes to the parity.
+    """
+    if isinstance(payload, str):
+        return payload.encode('utf-8', 'surrogatepass')
+    return payload
+
+
+class FecEncoder(object):
+    BLOCK_SIZE = 8 # in segments                        # Data segments per repair segment to start with
+    MIN_BLOCK_SIZE = 2 # in segments
+    MAX_BLOCK_SIZE = 16 # in segments
+    LOSS_GAIN = 0.05                                    # Weight of one observation in the loss rate average
+    LOSS_TARGET = 0.5                                   # Expected losses per block the block size aims for
+
+    def __init__(self, blockSize=BLOCK_SIZE, adaptive=True):
+        self.blockSize = blockSize
+        self.adaptive = adaptive
+        self.lossRate = 0.0
+        self.lengths = []
+        self.encodedLengths = []
+        self.parity = 0
+        self.text = False
+        self.countRepairs = 0
+
+    def add(self, payload):
+        """
+        Folds a new data segment into the current block. Returns the repair
+        payload when the block is complete, otherwise None.
+        """
+        encoded = encodePayload(payload)
+        self.text = isinstance(payload, str)
+        self.lengths.append(len(payload))
+        self.encodedLengths.append(len(encoded))
+        self.parity ^= int.from_bytes(encoded, 'little')
+        if len(self.lengths) >= self.blockSize:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """
+        Closes the current block. Returns its repair payload, or None if the
+        block is empty.
+        """
+        if not self.lengths:
+            return None
+        count = len(self.lengths)
+        lengths = self.lengths + self.encodedLengths if self.text else self.lengths
+        repair = REPAIR_HEADER.pack(self.text, count) + struct.pack('!{0}I'.format(len(lengths)), *lengths) \
+            + self.parity.to_bytes(max(self.encodedLengths), 'little')
+        self.lengths = []
+        self.encodedLengths = []
+        self.parity = 0
+        self.countRepairs += 1
+        return repair
+
+    def observe(self, lost) -> None:
+        """
+        Folds one sent (lost=False) or retransmitted (lost=True) segment into
+        the loss rate and resizes the blocks to match. Returns None.
+        """
+        if not self.adaptive:
+            return
+        self.lossRate += FecEncoder.LOSS_GAIN * (lost - self.lossRate)
+        if self.lossRate > 0:
+            size = int(FecEncoder.LOSS_TARGET / self.lossRate)
+            self.blockSize = min(max(size, FecEncoder.MIN_BLOCK_SIZE), FecEncoder.MAX_BLOCK_SIZE)
+
+
+class FecDecoder(object):
+    HISTORY = 64 # in segments                          # Delivered segments kept for rebuilding their neighbours
+
+    def __init__(self, history=HISTORY):
+        self.history = {}                               # start offset -> payload of recently delivered segments
+        self.order = deque()
+        self.historySize = history
+        self.repairs = {}                               # block end -> (start, text, lengths, encoded lengths, parity)
+        self.countRecovered = 0
+
+    def delivered(self, start, payload) -> None:
+        """
+        Remembers an in-order segment for repairs of its block. Returns None.
+        """
+        self.history[start] = payload
+        self.order.append(start)
+        if len(self.order) > self.historySize:
+            del self.history[self.order.popleft()]
+
+    def addRepair(self, end, payload, receiveSeqnum) -> None:
+        """
+        Stores the repair segment of the block ending at end unless the whole
+        block has already been received. Returns None.
+        """
+        if end <= receiveSeqnum:
+            return
+        text, count = REPAIR_HEADER.unpack_from(payload)
+        fields = 2 * count if text else count
+        lengths = struct.unpack_from('!{0}I'.format(fields), payload, REPAIR_HEADER.size)
+        parity = bytes(payload[REPAIR_HEADER.size + LENGTH_SIZE * fields:])
+        self.repairs[end] = (end - sum(lengths[:count]), text, lengths[:count], lengths[count:] or lengths, parity)
+
+    def recover(self, receiveSeqnum, receiveBuff) -> list:
+        """
+        Rebuilds every segment that is the only one missing from a block with
+        a stored repair. Returns the rebuilt segments as (start, end, payload).
+        """
+        recovered = []
+        for end in list(self.repairs):
+            if end <= receiveSeqnum:
+                del self.repairs[end]
+                continue
+            start, text, lengths, encodedLengths, parity = self.repairs[end]
+            missing = None
+            others = []
+            offset = start
+            for index, length in enumerate(lengths):
+                delivered = offset + length <= receiveSeqnum
+                payload = self.history.get(offset) if delivered else receiveBuff.get(offset)
+                if payload is None:
+                    if delivered or missing is not None:
+                        break                           # second loss or evicted history: parity cannot help yet
+                    missing = (offset, offset + length, encodedLengths[index])
+                else:
+                    others.append(payload)
+                offset += length
+            else:
+                if missing is None:
+                    del self.repairs[end]
+                    continue
+                value = int.from_bytes(parity, 'little')
+                for payload in others:
+                    value ^= int.from_bytes(encodePayload(payload), 'little')
+                data = value.to_bytes(len(parity), 'little')[:missing[2]]
+                if text:
+                    data = data.decode('utf-8', 'surrogatepass')
+                recovered.append((missing[0], missing[1], data))
+                self.countRecovered += 1
+                del self.repairs[end]
+        return recovered
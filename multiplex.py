@@ -0,0 +1,323 @@
+from collections import deque
+from functools import partial
+
+from rdt_layer import RDTLayer
+from segment import Segment
+
+
+# #################################################################################################################### #
+# Flow                                                                                                                 #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Per-connection record of the multiplexer: the RDTLayer of the flow, the segments waiting to be delivered to it or    #
+# sent for it, its deficit round robin credit and its statistics.                                                      #
+#                                                                                                                      #
+# #################################################################################################################### #
+class Flow(object):
+    __slots__ = ('connId', 'layer', 'inbox', 'outbox', 'deficit', 'scheduled',
+                 'countSegmentsSent', 'countSegmentsReceived', 'countBytesSent', 'countBytesReceived',
+                 'countQueueDrops', 'completedAt')
+
+    def __init__(self, connId, layer):
+        self.connId = connId
+        self.layer = layer
+        self.inbox = []                                 # segments routed to the flow, read by its layer
+        self.outbox = deque()                           # segments the layer sent, waiting for their DRR turn
+        self.deficit = 0
+        self.scheduled = False                          # in the multiplexer's active list
+        self.countSegmentsSent = 0
+        self.countSegmentsReceived = 0
+        self.countBytesSent = 0
+        self.countBytesReceived = 0
+        self.countQueueDrops = 0
+        self.completedAt = None                         # iteration at which both directions of the layer closed
+
+
+# #################################################################################################################### #
+# FlowChannel                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# The send/receive channel an RDTLayer sees inside a multiplexer. Sends are queued for the scheduler, receives hand    #
+# over the segments the multiplexer dispatched to the flow.                                                            #
+#                                                                                                                      #
+# #################################################################################################################### #
+class FlowChannel(object):
+    __slots__ = ('mux', 'flow')
+
+    def __init__(self, mux, flow):
+        self.mux = mux
+        self.flow = flow
+
+    def send(self, seg):
+        self.mux.enqueue(self.flow, seg)
+
+    def receive(self):
+        segments = self.flow.inbox
+        self.flow.inbox = []
+        return segments
+
+    @property
+    def maxPayloadSize(self):
+        return getattr(self.mux.sendChannel, 'maxPayloadSize', None)
+
+
+# #################################################################################################################### #
+# RDTMultiplexer                                                                                                       #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Carries many RDT flows over one channel pair (or one UdpChannel). Every segment is stamped with the connection id of #
+# its flow, incoming segments are dispatched to their flow with one dict lookup, and outgoing segments are scheduled   #
+# across flows with deficit round robin so a bulk transfer cannot starve the others.                                   #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Call processData() once per iteration in place of the per-layer calls. All flows share the multiplexer's iteration   #
+# clock, so flows with nothing to do are skipped. capacity limits the payload bytes handed to the channel per          #
+# iteration (None sends everything queued); each flow then queues at most queueLimit segments and tail-drops the rest, #
+# so a backlog shows up to its congestion control as loss. With acceptFlows, a segment for an unknown connection id    #
+# opens a flow, as a server would. With closeCompleted, a flow whose layer isClosed() is closed linger iterations      #
+# later, the grace period in which it still answers a retransmitted FIN whose FIN-ACK was lost. Its connection id then #
+# stays in TIME_WAIT for timeWait iterations, as long as the peer may go on retransmitting its FIN: a FIN for it gets  #
+# a FIN-ACK and any other segment is dropped, so a late segment never reopens the flow. An accepted flow only          #
+# completes once the application calls close() on its layer; with autoClose, one that has sent nothing closes by       #
+# itself once the peer's data is complete, for servers that only receive.                                              #
+#                                                                                                                      #
+# #################################################################################################################### #
+class RDTMultiplexer(object):
+    QUANTUM = 64 # in bytes                             # DRR credit a flow earns per round
+    HEADER_COST = 32 # in bytes                         # Scheduling cost of a segment on top of its payload
+    QUEUE_LIMIT = 64 # in segments                      # Per-flow send queue before tail drop
+    LINGER = 4 * RDTLayer.MAX_TIMEOUT # in iterations   # How long a completed flow stays before closeCompleted drops it
+    # in iterations, the longest a peer retransmits its FIN: how long the id of a closed flow stays in TIME_WAIT
+    TIME_WAIT = (RDTLayer.MAX_FIN_RETRIES + 1) * RDTLayer.MAX_TIMEOUT
+
+    def __init__(self, sendChannel, receiveChannel=None, quantum=QUANTUM, capacity=None, queueLimit=QUEUE_LIMIT,
+                 acceptFlows=False, closeCompleted=False, linger=LINGER, timeWait=TIME_WAIT, autoClose=False,
+                 **layerOptions):
+        self.sendChannel = sendChannel
+        self.receiveChannel = receiveChannel if receiveChannel is not None else sendChannel
+        self.quantum = quantum
+        self.capacity = capacity
+        self.queueLimit = queueLimit
+        self.acceptFlows = acceptFlows
+        self.closeCompleted = closeCompleted
+        self.linger = linger
+        self.timeWait = timeWait
+        self.autoClose = autoClose
+        self.layerOptions = layerOptions
+        self.currentIteration = 0
+        self.flows = {}                                 # connId -> Flow
+        self.closedFlows = {}                           # connId -> iteration closed, oldest first (TIME_WAIT)
+        self.active = deque()                           # flows with queued segments, in DRR order
+        self.nextConnId = 1
+        self.countUnknownSegments = 0
+        self.countCompletedFlows = 0
+        self.countAbortedFlows = 0
+        self.countTimeWaitSegments = 0
+        # totals of the flows closeFlow() has forgotten, so the aggregate statistics cover every flow
+        self.closedBytesDelivered = 0
+        self.closedSegmentTimeouts = 0
+        self.closedQueueDrops = 0
+        self.countSegmentsSent = 0
+        self.countBytesSent = 0
+
+    def openFlow(self, connId=None, **layerOptions) -> RDTLayer:
+        """
+        Creates a flow and returns its RDTLayer, ready for setDataToSend().
+        """
+        if connId is None:
+            while self.nextConnId in self.flows:
+                self.nextConnId += 1
+            connId = self.nextConnId
+            self.nextConnId += 1
+        if connId in self.flows:
+            raise ValueError("Connection id {0} is already open".format(connId))
+        options = dict(self.layerOptions)
+        options.update(layerOptions)
+        layer = RDTLayer(clock=self.getIteration, connId=connId, **options)
+        flow = Flow(connId, layer)
+        channel = FlowChannel(self, flow)
+        layer.setSendChannel(channel)
+        layer.setReceiveChannel(channel)
+        self.flows[connId] = flow
+        return layer
+
+    def closeFlow(self, connId) -> None:
+        """
+        Forgets a flow and puts its connection id in TIME_WAIT, keeping its
+        counters in the multiplexer's totals. Segments still queued for it
+        are discarded.
+        """
+        flow = self.flows.pop(connId)
+        self.closedBytesDelivered += flow.layer.getReceivedLength()
+        self.closedSegmentTimeouts += flow.layer.countSegmentTimeouts
+        self.closedQueueDrops += flow.countQueueDrops
+        self.closedFlows.pop(connId, None)
+        self.closedFlows[connId] = self.currentIteration
+        flow.outbox.clear()
+        if flow.scheduled:
+            self.active.remove(flow)
+            flow.scheduled = False
+
+    def getLayer(self, connId) -> RDTLayer:
+        return self.flows[connId].layer
+
+    def getIteration(self):
+        return self.currentIteration
+
+    def enqueue(self, flow, seg) -> None:
+        if len(flow.outbox) >= self.queueLimit:
+            flow.countQueueDrops += 1
+            return
+        flow.outbox.append(seg)
+        if not flow.scheduled:
+            flow.scheduled = True
+            flow.deficit = 0
+            self.active.append(flow)
+
+    # ################################################################################################################ #
+    # processData()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # "timeslice" for every flow: dispatch what arrived, run the flows that have work, then schedule their segments    #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def processData(self):
+        self.currentIteration += 1
+
+        # TIME_WAIT entries expire in the order they were closed
+        for connId in list(self.closedFlows):
+            if self.currentIteration - self.closedFlows[connId] < self.timeWait:
+                break
+            del self.closedFlows[connId]
+
+        for seg in self.receiveChannel.receive():
+            flow = self.flows.get(seg.connId)
+            if flow is None:
+                if seg.connId in self.closedFlows:
+                    self.countTimeWaitSegments += 1
+                    if seg.fin and seg.seqnum >= 0:
+                        self.sendFinAck(seg)
+                    continue
+                if not self.acceptFlows:
+                    self.countUnknownSegments += 1
+                    continue
+                layer = self.openFlow(seg.connId)
+                if self.autoClose:
+                    layer.setCompletionCallback(partial(self.onAcceptedComplete, layer))
+                flow = self.flows[seg.connId]
+            flow.inbox.append(seg)
+            flow.countSegmentsReceived += 1
+            flow.countBytesReceived += len(seg.payload)
+
+        for flow in list(self.flows.values()):
+            layer = flow.layer
+            if flow.inbox or layer.timers or layer.ackOwed or layer.isSendPending() or \
+                    (layer.closing and layer.finOffset is None):
+                layer.processData()
+            # completion is a flag on the layer, so finished flows are found without looking at their data
+            if flow.completedAt is None:
+                if layer.isClosed():
+                    flow.completedAt = self.currentIteration
+                    if layer.isComplete():
+                        self.countCompletedFlows += 1
+                    else:
+                        self.countAbortedFlows += 1
+            elif self.closeCompleted and self.currentIteration - flow.completedAt >= self.linger and not flow.outbox:
+                self.closeFlow(flow.connId)
+
+        self.schedule()
+
+    def onAcceptedComplete(self, layer, direction) -> None:
+        """
+        autoClose: closes an accepted flow that has sent nothing once the
+        peer's data is complete. Returns None.
+        """
+        if direction == 'receive' and not layer.closing and not layer.isSendPending() and not layer.seqnum:
+            layer.close()
+
+    def sendFinAck(self, seg) -> None:
+        """
+        Answers a FIN for a connection id in TIME_WAIT. The flow only closed
+        after everything up to the FIN was delivered, so the FIN-ACK
+        acknowledges the FIN's offset. Returns None.
+        """
+        segmentAck = self.layerOptions.get('segmentClass', Segment)()
+        segmentAck.connId = seg.connId
+        segmentAck.fin = True
+        segmentAck.setAck(seg.seqnum)
+        self.sendChannel.send(segmentAck)
+        self.countSegmentsSent += 1
+
+    def schedule(self) -> None:
+        """
+        Hands queued segments to the channel in deficit round robin order,
+        up to capacity payload bytes. Returns None.
+        """
+        budget = self.capacity
+        while self.active:
+            flow = self.active.popleft()
+            flow.deficit += self.quantum
+            channelFull = False
+            while flow.outbox:
+                seg = flow.outbox[0]
+                cost = len(seg.payload) + RDTMultiplexer.HEADER_COST
+                if budget is not None and cost > budget:
+                    channelFull = True
+                    break
+                if cost > flow.deficit:
+                    break
+                flow.outbox.popleft()
+                flow.deficit -= cost
+                if budget is not None:
+                    budget -= cost
+                self.sendChannel.send(seg)
+                flow.countSegmentsSent += 1
+                flow.countBytesSent += len(seg.payload)
+                self.countSegmentsSent += 1
+                self.countBytesSent += len(seg.payload)
+            if flow.outbox:
+                self.active.append(flow)
+            else:
+                flow.scheduled = False
+                flow.deficit = 0
+            if channelFull:
+                # the flow keeps its credit and its place for the next iteration
+                self.active.rotate(1)
+                break
+
+    def getFlowStatistics(self, connId) -> dict:
+        """
+        Returns the counters of one flow.
+        """
+        flow = self.flows[connId]
+        return {
+            'connId': connId,
+            'segmentsSent': flow.countSegmentsSent,
+            'segmentsReceived': flow.countSegmentsReceived,
+            'bytesSent': flow.countBytesSent,
+            'bytesReceived': flow.countBytesReceived,
+            'bytesDelivered': flow.layer.getReceivedLength(),
+            'segmentTimeouts': flow.layer.countSegmentTimeouts,
+            'queueDrops': flow.countQueueDrops,
+            'throughput': flow.layer.getReceivedLength() / max(self.currentIteration, 1),
+        }
+
+    def getAggregateStatistics(self) -> dict:
+        """
+        Returns the counters summed over all flows, closed ones included.
+        """
+        delivered = self.closedBytesDelivered + sum(flow.layer.getReceivedLength() for flow in self.flows.values())
+        return {
+            'flows': len(self.flows),
+            'completedFlows': self.countCompletedFlows,
+            'segmentsSent': self.countSegmentsSent,
+            'bytesSent': self.countBytesSent,
+            'bytesDelivered': delivered,
+            'segmentTimeouts': self.closedSegmentTimeouts
+                + sum(flow.layer.countSegmentTimeouts for flow in self.flows.values()),
+            'queueDrops': self.closedQueueDrops + sum(flow.countQueueDrops for flow in self.flows.values()),
+            'abortedFlows': self.countAbortedFlows,
+            'unknownSegments': self.countUnknownSegments,
+            'timeWaitSegments': self.countTimeWaitSegments,
+            'throughput': delivered / max(self.currentIteration, 1),
+        }
@@ -0,0 +1,279 @@
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from rdt_layer import RDTLayer
+from unreliable import UnreliableChannel
+
+
+# #################################################################################################################### #
+# Benchmark                                                                                                            #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Runs RDTLayer over a pair of UnreliableChannels with a fixed seed for every combination of payload size, loss        #
+# profile, DATA_LENGTH, receive window and congestion control, and records iterations, wall time, goodput,             #
+# retransmission ratio, ACK overhead, peak memory and the peak size of the receiver's reassembly buffer for each run.  #
+# Results are written as JSON; --compare checks them against a saved baseline and exits with status 1 when a metric    #
+# got worse by more than the tolerance.                                                                                #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Sizes take K/M/G suffixes (powers of 1024). Payloads are seeded random bytes, or seeded English-like words with      #
+# --payload text (to measure compression); both run the binary path of the layer.                                      #
+# The layers run with tracing disabled. Peak memory is measured with tracemalloc and the reassembly buffer with its    #
+# getMemoryFootprint() every iteration, which slows the run down; --no-memory skips both when only the timings matter. #
+#                                                                                                                      #
+#   python rdt_benchmark.py --sizes 4K 64K --profiles reliable default --output baseline.json                          #
+#   python rdt_benchmark.py --sizes 4K 64K --profiles reliable default --compare baseline.json                         #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+# UnreliableChannel keyword arguments: the can* flags and the ratio overrides
+CHANNEL_FLAGS = ('canDeliverOutOfOrder', 'canDropPackets', 'canDelayPackets', 'canHaveChecksumErrors')
+ALL_IMPAIRMENTS = dict.fromkeys(CHANNEL_FLAGS, True)
+PROFILES = {
+    'reliable': dict.fromkeys(CHANNEL_FLAGS, False),
+    'default': ALL_IMPAIRMENTS,
+    'lossy': dict(ALL_IMPAIRMENTS, ratioDroppedPackets=0.2, ratioDataErrorPackets=0.2),
+    'reorder': dict(ALL_IMPAIRMENTS, canDropPackets=False, canHaveChecksumErrors=False,
+                    ratioOutOfOrderPackets=0.5, ratioDelayedPackets=0.3),
+    'corrupt': dict(dict.fromkeys(CHANNEL_FLAGS, False), canHaveChecksumErrors=True, ratioDataErrorPackets=0.3),
+}
+
+# Metric -> direction in which it gets worse, used by compare mode
+METRICS = {
+    'iterations': 'higher',
+    'wallTime': 'higher',
+    'goodput': 'lower',
+    'goodputPerIteration': 'lower',
+    'retransmissionRatio': 'higher',
+    'ackOverhead': 'higher',
+    'peakMemory': 'higher',
+    'peakReassemblyMemory': 'higher',
+}
+
+# Vocabulary of the text payload
+WORDS = ('we', 'choose', 'to', 'go', 'the', 'moon', 'in', 'this', 'decade', 'and', 'do', 'other', 'things', 'not',
+         'because', 'they', 'are', 'easy', 'but', 'hard', 'that', 'goal', 'will', 'serve', 'organize', 'measure',
+         'best', 'of', 'our', 'energies', 'skills', '{"id": 1962, "status": "ok"}', '\r\n')
+PAYLOADS = ('random', 'text')
+
+SEED = 1962
+MAX_ITERATIONS = 10000000
+TOLERANCE = 0.10                                        # Relative change tolerated before a metric is a regression
+TIME_TOLERANCE = 0.25                                   # Wall time and goodput are noisier than the counters
+
+
+def parseSize(text) -> int:
+    """
+    Returns the number of bytes in a size such as 512, 4K or 200M.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def makePayload(size, kind, seed) -> bytes:
+    """
+    Returns size seeded bytes of the given PAYLOADS kind.
+    """
+    rng = random.Random(seed)
+    if kind == 'random':
+        return rng.randbytes(size)
+    text = bytearray()
+    while len(text) < size:
+        text += ' '.join(rng.choices(WORDS, k=256)).encode() + b' '
+    return bytes(text[:size])
+
+
+def createChannel(channelOptions) -> UnreliableChannel:
+    """
+    Returns an UnreliableChannel for keyword options holding the can* flags
+    (missing flags are False) and any ratio overrides.
+    """
+    options = dict(channelOptions)
+    flags = [options.pop(name, False) for name in CHANNEL_FLAGS]
+    return UnreliableChannel(*flags, **options)
+
+
+def simulate(size, channelOptions, layerOptions, seed=SEED, measureMemory=True, maxIterations=MAX_ITERATIONS,
+             payload='random') -> dict:
+    """
+    Transfers size seeded bytes of the payload kind from a client to a
+    server layer over two channels built from channelOptions, with
+    layerOptions passed to both layers. Returns the metrics of the run.
+    """
+    random.seed(seed)
+    data = makePayload(size, payload, seed)
+
+    clientToServerChannel = createChannel(channelOptions)
+    serverToClientChannel = createChannel(channelOptions)
+    client = RDTLayer(**layerOptions)
+    server = RDTLayer(receiveCapacity=size, **layerOptions)
+    client.setSendChannel(clientToServerChannel)
+    client.setReceiveChannel(serverToClientChannel)
+    server.setSendChannel(serverToClientChannel)
+    server.setReceiveChannel(clientToServerChannel)
+    client.setDataToSend(data)
+
+    reassemblyMemory = 0
+    if measureMemory:
+        tracemalloc.start()
+    loopIter = 0
+    start = time.perf_counter()
+    while loopIter < maxIterations:
+        loopIter += 1
+        client.processData()
+        clientToServerChannel.processData()
+        server.processData()
+        serverToClientChannel.processData()
+        if measureMemory:
+            reassemblyMemory = max(reassemblyMemory, server.receiveBuff.getMemoryFootprint())
+        # the length check keeps the per-iteration cost O(1), the content is compared once at the end
+        if server.getReceivedLength() >= size:
+            break
+    wallTime = time.perf_counter() - start
+    peakMemory = None
+    if measureMemory:
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    received = server.getDataReceived()
+    dataPackets = clientToServerChannel.countTotalDataPackets
+    compression = client.getCompressionStats()['send']
+    decompression = server.getCompressionStats()['receive']
+    return {
+        'completed': len(received) == size and received == data,
+        'iterations': loopIter,
+        'wallTime': wallTime,
+        'goodput': len(received) / wallTime if wallTime else 0.0,
+        'goodputPerIteration': len(received) / loopIter,
+        'retransmissionRatio': client.countSegmentTimeouts / dataPackets if dataPackets else 0.0,
+        'ackOverhead': serverToClientChannel.countAckPackets / dataPackets if dataPackets else 0.0,
+        'segmentTimeouts': client.countSegmentTimeouts,
+        'fastRetransmits': client.countFastRetransmits,
+        'fecRecoveries': server.countFecRecoveries,
+        'dataPackets': dataPackets,
+        'ackPackets': serverToClientChannel.countAckPackets,
+        'peakMemory': peakMemory,
+        'peakReassemblyMemory': reassemblyMemory if measureMemory else None,
+        'compressionRatio': compression['ratio'] if compression else None,
+        'compressionTime': compression['cpuTime'] if compression else None,
+        'decompressionTime': decompression['cpuTime'] if decompression else None,
+    }
+
+
+def runTransfer(size, profileName, length, window, congestionControl, seed=SEED, measureMemory=True,
+                maxIterations=MAX_ITERATIONS, compression=None, payload='random') -> dict:
+    """
+    Runs one benchmark configuration and returns it together with its
+    metrics.
+    """
+    result = {
+        'size': size,
+        'profile': profileName,
+        'dataLength': length,
+        'window': window,
+        'congestionControl': congestionControl,
+        'seed': seed,
+        'compression': compression,
+        'payload': payload,
+    }
+    layerOptions = {'dataLength': length, 'receiveBufferSize': window, 'congestionControl': congestionControl,
+                    'compression': compression}
+    result.update(simulate(size, PROFILES[profileName], layerOptions, seed, measureMemory, maxIterations, payload))
+    return result
+
+
+def runKey(result) -> tuple:
+    # runs saved before compression and payload kinds existed were uncompressed random payloads
+    return (result['size'], result['profile'], result['dataLength'], result['window'],
+            result['congestionControl'], result['seed'], result.get('compression'), result.get('payload', 'random'))
+
+
+def compareResults(results, baseline, tolerance=TOLERANCE, timeTolerance=TIME_TOLERANCE) -> list:
+    """
+    Returns a list of (run key, metric, baseline value, new value) for every
+    metric that got worse than the baseline by more than the tolerance. A run
+    that completed in the baseline but not any more is reported as well.
+    """
+    previous = {runKey(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        key = runKey(result)
+        old = previous.get(key)
+        if old is None:
+            continue
+        if old['completed'] and not result['completed']:
+            regressions.append((key, 'completed', True, False))
+        for metric, worse in METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            allowed = timeTolerance if metric in ('wallTime', 'goodput') else tolerance
+            if worse == 'higher' and after > before * (1 + allowed):
+                regressions.append((key, metric, before, after))
+            elif worse == 'lower' and after < before * (1 - allowed):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark RDTLayer over UnreliableChannel")
+    parser.add_argument('--sizes', nargs='+', default=['1K', '4K'], help="payload sizes, e.g. 4K 1M 200M")
+    parser.add_argument('--profiles', nargs='+', default=['reliable', 'default'], choices=sorted(PROFILES))
+    parser.add_argument('--data-lengths', nargs='+', type=int, default=[RDTLayer.DATA_LENGTH])
+    parser.add_argument('--windows', nargs='+', type=int, default=[RDTLayer.RECEIVE_BUFFER_SIZE],
+                        help="receive windows advertised by the server, in characters")
+    parser.add_argument('--congestion', nargs='+', default=['cubic'])
+    parser.add_argument('--compression', nargs='+', default=['none'], choices=['none', 'zlib', 'zstd'])
+    parser.add_argument('--payload', default='random', choices=PAYLOADS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS)
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc peak memory measurement")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to check the results against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = []
+    for size, profile, length, window, congestionControl, compression in itertools.product(
+            [parseSize(size) for size in args.sizes], args.profiles, args.data_lengths, args.windows, args.congestion,
+            [None if name == 'none' else name for name in args.compression]):
+        result = runTransfer(size, profile, length, window, congestionControl, args.seed, not args.no_memory,
+                             args.max_iterations, compression, args.payload)
+        results.append(result)
+        print("size: {0}, profile: {1}, dataLength: {2}, window: {3}, cc: {4} -> iterations: {5}, wall: {6:.3f}s, "
+              "goodput: {7:.0f} B/s, retransmit ratio: {8:.3f}, ack overhead: {9:.3f}, peak memory: {10}, "
+              "peak reassembly: {11}{12}"
+              .format(size, profile, length, window, congestionControl, result['iterations'], result['wallTime'],
+                      result['goodput'], result['retransmissionRatio'], result['ackOverhead'], result['peakMemory'],
+                      result['peakReassemblyMemory'], '' if result['completed'] else ' INCOMPLETE'))
+        if compression:
+            print("    {0}: ratio {1:.2f}, compress {2:.4f}s, decompress {3:.4f}s".format(
+                compression, result['compressionRatio'], result['compressionTime'], result['decompressionTime']))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compareResults(results, baseline, args.tolerance, args.time_tolerance)
+        for key, metric, before, after in regressions:
+            print("REGRESSION {0}: {1} {2} -> {3}".format(key, metric, before, after))
+        if regressions:
+            return 1
+        print("No regressions against {0}".format(args.compare))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,13 @@
+import math
+from bisect import bisect_left, bisect_right
 from segment import Segment
+from congestion import FixedWindow, createCongestionControl
+from reassembly import ReassemblyBuffer
+from timer_wheel import TimerWheel
+from streaming import StreamSource
+from fec import FecDecoder, FecEncoder, LENGTH_SIZE, REPAIR_HEADER
+from compression import CompressedSource, DEFAULT_LEVEL, StreamDecompressor
+import tracing
 
 
 # #################################################################################################################### #
@@ -26,7 +35,20 @@ class RDTLayer(object):
     #                                                                                                                  #
     # ################################################################################################################ #
     DATA_LENGTH = 4 # in characters                     # The length of the string data that will be sent per packet...
-    FLOW_CONTROL_WIN_SIZE = 15 # in characters          # Receive window size for flow-control
+    FLOW_CONTROL_WIN_SIZE = 15 # in characters          # Window of the legacy 'fixed' congestion control
+    RECEIVE_BUFFER_SIZE = 4096 # in characters          # Reassembly space advertised as the receive window
+    INITIAL_RECEIVE_CAPACITY = 65536 # in bytes         # Preallocated output buffer of a binary transfer
+    MAX_SACK_BLOCKS = 4                                 # Most selective-ACK ranges carried by one ACK segment
+    FIXED_TIMEOUT = 1 # in iterations                   # Legacy timer for a first transmission
+    FIXED_RETRANSMIT_TIMEOUT = 3 # in iterations        # Legacy timer after a retransmission
+    INITIAL_TIMEOUT = 3 # in iterations                 # Adaptive RTO before the first RTT sample
+    MIN_TIMEOUT = 1 # in iterations                     # Lower bound of the adaptive RTO
+    MAX_TIMEOUT = 16 # in iterations                    # Upper bound of the adaptive RTO and its backoff
+    DUP_ACK_THRESHOLD = 3                               # Duplicate ACKs that trigger a fast retransmit
+    MAX_ACK_DELAY = 0 # in iterations                   # Longest a coalesced ACK is held past its processing round
+    ACK_EVERY = 2 # in segments                         # In-order segments covered by one coalesced ACK at most
+    FIN_TIMER = -1                                      # Timer wheel key of the FIN retransmission
+    MAX_FIN_RETRIES = 8                                 # Unanswered FINs after the last ACK before giving up the peer
     sendChannel = None
     receiveChannel = None
     dataToSend = ''
@@ -40,28 +62,113 @@ class RDTLayer(object):
     #                                                                                                                  #
     #                                                                                                                  #
     # ################################################################################################################ #
-    def __init__(self):
+    def __init__(self, cumulativeAck=True, adaptiveTimeout=True, initialTimeout=INITIAL_TIMEOUT,
+                 minTimeout=MIN_TIMEOUT, maxTimeout=MAX_TIMEOUT, fastRetransmit=True,
+                 dupAckThreshold=DUP_ACK_THRESHOLD, delayedAck=True, maxAckDelay=MAX_ACK_DELAY, ackEvery=ACK_EVERY,
+                 congestionControl='cubic',
+                 receiveBufferSize=RECEIVE_BUFFER_SIZE, receiveCapacity=INITIAL_RECEIVE_CAPACITY,
+                 segmentClass=Segment, clock=None, connId=0, tracer=None, dataLength=DATA_LENGTH, nagle=True,
+                 fec=False, fecBlockSize=FecEncoder.BLOCK_SIZE, adaptiveFec=True, compression=None,
+                 compressionLevel=DEFAULT_LEVEL, maxFinRetries=MAX_FIN_RETRIES):
         self.sendChannel = None
         self.receiveChannel = None
+        self.dataLength = dataLength                    # Largest payload per segment, capped by the channel's limit
+        self.payloadLimit = None                        # Channel limit in bytes: text segments are cut by encoded size
+        self.nagle = nagle                              # Hold a short segment while data is in flight and more may come
+        self.appendable = False                         # Data came from write(), so the application may add more
         self.dataToSend = ''
+        self.source = None                              # Streaming mode: StreamSource-like object replacing dataToSend
         self.currentIteration = 0
-        self.seqnum = 0
+        self.clock = clock                              # Optional callable giving the current tick, replaces iterations
+        self.seqnum = 0                                 # Sender: end of the data sent so far
+        self.receiveSeqnum = 0                          # Receiver: end of the data delivered in order
+        self.peerSending = False                        # Data has arrived, so outgoing data segments carry ACKs
         self.received = ''
-        self.receiveBuff = []
+        self.receiveCapacity = receiveCapacity          # Size hint for the binary output buffer
+        self.receivedBytes = None                       # Binary mode: bytearray the payloads are written into
+        self.receivedLength = 0
+        self.sink = None                                # Streaming mode: callable handed in-order data, nothing is kept
+        self.deliveredLength = 0                        # In-order characters delivered, whichever the mode
+        self.receiveBuff = ReassemblyBuffer()
         self.sendBuff = {}
+        self.sendEnds = []                              # sendBuff keys in ascending order, searched for SACK blocks
+        self.timers = TimerWheel(clock() if clock else 0)  # Retransmit deadlines of the sendBuff entries, keyed by seqnum
         self.countSegmentTimeouts = 0
         self.unacked = 0
+        self.cumulativeAck = cumulativeAck              # ACK highest in-order seqnum + SACK blocks instead of each segment
+        self.segmentClass = segmentClass                # Segment or CompactSegment, used for every segment built here
+        self.connId = connId                            # Stamped on every segment so a multiplexer can route it
+        self.tracer = tracer if tracer is not None else tracing.Tracer()  # Disabled unless given a level
+
+        # Retransmission timeout (RFC 6298 style, measured in iterations)
+        self.adaptiveTimeout = adaptiveTimeout          # False keeps the fixed legacy timers
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.rto = initialTimeout
+        self.srtt = None
+        self.rttvar = None
+
+        # Fast retransmit (only meaningful with cumulative ACKs)
+        self.fastRetransmit = fastRetransmit
+        self.dupAckThreshold = dupAckThreshold
+        self.lastAck = 0
+        self.dupAcks = 0
+        self.countFastRetransmits = 0
+
+        # Delayed ACKs (only meaningful with cumulative ACKs)
+        self.delayedAck = delayedAck                    # Coalesce the ACKs of in-order data within a round
+        self.maxAckDelay = maxAckDelay
+        self.ackEvery = ackEvery                        # None coalesces a whole round into one ACK
+        self.ackOwed = 0                                # In-order segments that no segment has acknowledged yet
+        self.ackOwedSince = 0
+
+        # Congestion control and flow control
+        if congestionControl == 'fixed':
+            # the legacy window counts characters, the engine counts segments
+            congestionControl = FixedWindow(max(RDTLayer.FLOW_CONTROL_WIN_SIZE // dataLength, 1))
+        self.congestionControl = createCongestionControl(congestionControl)
+        self.receiveBufferSize = receiveBufferSize      # Receiver side: out of order characters it can hold
+        self.peerWindow = RDTLayer.RECEIVE_BUFFER_SIZE  # Sender side: last window advertised by the receiver
+        self.recover = 0                                # Losses below this seqnum belong to the last window cut
+
+        # Forward error correction: XOR repair segments per block of data segments, see fec.py
+        self.fecEncoder = FecEncoder(fecBlockSize, adaptiveFec) if fec else None
+        self.fecDecoder = None                          # Created by the first repair segment the peer sends
+        self.countFecRecoveries = 0
+
+        # Payload compression: 'zlib' or 'zstd' compresses what this layer sends, see compression.py
+        self.compression = compression
+        self.compressionLevel = compressionLevel
+        self.decompressor = None                        # Created when the peer's data arrives compressed
+
+        # Teardown: a FIN announces the end offset of the data, the peer's FIN-ACK confirms all of it arrived
+        self.closing = False                            # The data to send has an end, a FIN follows it
+        self.finOffset = None                           # Sender: end offset announced by our FIN, once sent
+        self.sendComplete = False                       # Our FIN has been acknowledged
+        self.maxFinRetries = maxFinRetries
+        self.finRetries = 0                             # FIN retransmissions since the peer last acknowledged data
+        self.finAbandoned = False                       # All data acknowledged but maxFinRetries FINs unanswered
+        self.peerFinOffset = None                       # Receiver: end offset announced by the peer's FIN
+        self.receiveComplete = False                    # The peer's FIN arrived and everything before it is delivered
+        self.completionCallback = None
 
     # ################################################################################################################ #
     # setSendChannel()                                                                                                 #
     #                                                                                                                  #
     # Description:                                                                                                     #
-    # Called by main to set the unreliable sending lower-layer channel                                                 #
-    #                                                                                                                  #
+    # Called by main to set the unreliable sending lower-layer channel. A channel with a maxPayloadSize (an MTU-like   #
+    # limit in bytes) caps the segment size, leaving room for the segment lengths a repair segment carries with fec.   #
+    # Text segments are also cut to fit the limit once UTF-8 encoded.                                                  #
     #                                                                                                                  #
     # ################################################################################################################ #
     def setSendChannel(self, channel):
         self.sendChannel = channel
+        limit = getattr(channel, 'maxPayloadSize', None)
+        if limit:
+            if self.fecEncoder is not None:
+                limit -= REPAIR_HEADER.size + 2 * LENGTH_SIZE * FecEncoder.MAX_BLOCK_SIZE
+            self.payloadLimit = limit
+            self.dataLength = min(self.dataLength, limit)
 
     # ################################################################################################################ #
     # setReceiveChannel()                                                                                              #
@@ -78,27 +185,152 @@ class RDTLayer(object):
     # setDataToSend()                                                                                                  #
     #                                                                                                                  #
     # Description:                                                                                                     #
-    # Called by main to set the string data to send                                                                    #
-    #                                                                                                                  #
+    # Called by main to set the string data to send. bytes, bytearray and memoryview data switch to the binary mode,   #
+    # where segment payloads are zero-copy memoryview slices of the caller's buffer. With compression the data is      #
+    # sent as a compressed stream instead.                                                                             #
     #                                                                                                                  #
     # ################################################################################################################ #
     def setDataToSend(self,data):
-        self.dataToSend = data
+        self.source = None
+        self.appendable = False
+        self.closing = True
+        if self.compression is not None:
+            self.setDataToStream(data)
+        elif isinstance(data, str):
+            self.dataToSend = data
+        else:
+            self.dataToSend = memoryview(data).cast('B')
 
     # ################################################################################################################ #
-    # getDataReceived()                                                                                                #
+    # write()                                                                                                          #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Appends an application write to the data to send. Small writes are coalesced into full segments: with nagle a    #
+    # short segment is held back while earlier data is unacknowledged. With compression the writes feed one open       #
+    # compressed stream, which cannot follow data already sent by setDataToSend() or setDataToStream().                #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def write(self, data):
+        if self.finOffset is not None:
+            raise ValueError("The sending side is closed")
+        self.closing = False
+        if self.compression is not None:
+            if not (isinstance(self.source, CompressedSource) and self.source.open):
+                if self.seqnum:
+                    raise ValueError("A finished compressed stream cannot be written to")
+                self.dataToSend = ''
+                self.source = CompressedSource(None, self.compression, self.compressionLevel)
+            # own copy, the compressor reads it later
+            self.source.append(data if isinstance(data, str) else bytes(data))
+            self.appendable = True
+            return
+        self.source = None
+        if isinstance(data, str) or isinstance(self.dataToSend, bytearray):
+            self.dataToSend += data
+        else:
+            # own copy: segments in flight may hold views of the caller's buffer
+            self.dataToSend = bytearray(self.dataToSend or b'') + data
+        self.appendable = True
+
+    # ################################################################################################################ #
+    # setDataToStream()                                                                                                #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Sends from an iterator of chunks, a file-like object or a source from streaming.py (MappedFileSource for an      #
+    # mmap-ed file). Only the unacknowledged window is kept in memory. With compression the source is read through a   #
+    # CompressedSource.                                                                                                #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setDataToStream(self, source):
+        if self.compression is not None:
+            source = CompressedSource(source, self.compression, self.compressionLevel)
+        elif not hasattr(source, 'available'):
+            source = StreamSource(source)
+        self.dataToSend = ''
+        self.appendable = False
+        self.closing = True
+        self.source = source
+
+    # ################################################################################################################ #
+    # close()                                                                                                          #
     #                                                                                                                  #
     # Description:                                                                                                     #
-    # Called by main to get the currently received and buffered string data, in order                                  #
+    # Ends the data written with write(): a FIN carrying the total length follows the last segment. setDataToSend()    #
+    # and setDataToStream() close on their own once their data is sent. A layer with nothing to send calls it to let   #
+    # the peer complete.                                                                                               #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def close(self):
+        self.appendable = False
+        if isinstance(self.source, CompressedSource):
+            self.source.open = False
+        self.closing = True
+
+    # ################################################################################################################ #
+    # setCompletionCallback()                                                                                          #
     #                                                                                                                  #
+    # Description:                                                                                                     #
+    # callback is called with 'send' once the peer has acknowledged our FIN, so all our data arrived, and with         #
+    # 'receive' once the peer's FIN arrived and all its data has been delivered. It is called with 'abort' instead of  #
+    # 'send' if, with all data acknowledged, the FIN goes unanswered maxFinRetries times.                              #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setCompletionCallback(self, callback):
+        self.completionCallback = callback
+
+    def isSendComplete(self) -> bool:
+        return self.sendComplete
+
+    def isReceiveComplete(self) -> bool:
+        return self.receiveComplete
+
+    def isComplete(self) -> bool:
+        """
+        Returns True once both directions are closed: our FIN is acknowledged
+        and the peer's FIN and data have arrived.
+        """
+        return self.sendComplete and self.receiveComplete
+
+    def isClosed(self) -> bool:
+        """
+        Returns True once the layer has nothing left to do: both directions
+        are complete or the peer stopped answering our FIN.
+        """
+        return self.isComplete() or self.finAbandoned
+
+    # ################################################################################################################ #
+    # setDataSink()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Hands in-order data to sink (a callable or an object with write()) as it is delivered instead of keeping it;     #
+    # getDataReceived() then stays empty. A binary payload may be a view that is only valid during the call.           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setDataSink(self, sink):
+        self.sink = sink.write if hasattr(sink, 'write') else sink
+
+    # ################################################################################################################ #
+    # getDataReceived()                                                                                                #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to get the currently received and buffered string data, in order. A binary transfer returns a     #
+    # memoryview of the reassembly buffer instead of a copy.                                                           #
     #                                                                                                                  #
     # ################################################################################################################ #
     def getDataReceived(self):
         # ############################################################################################################ #
         # Identify the data that has been received...
         # ############################################################################################################ #
+        if self.receivedBytes is not None:
+            return memoryview(self.receivedBytes)[:self.receivedLength]
         return self.received
 
+    def getReceivedLength(self) -> int:
+        """
+        Returns the number of in-order characters (or bytes) delivered so far.
+        """
+        return self.deliveredLength
+
     # ################################################################################################################ #
     # processData()                                                                                                    #
     #                                                                                                                  #
@@ -108,9 +340,40 @@ class RDTLayer(object):
     #                                                                                                                  #
     # ################################################################################################################ #
     def processData(self):
-        self.currentIteration += 1
+        self.tick()
         self.processSend()
         self.processReceiveAndSendRespond()
+        if self.tracer.sampling:
+            self.tracer.sample(self)
+
+    # ################################################################################################################ #
+    # tick()                                                                                                           #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Advances currentIteration, the time base of every timer and RTT sample. With a clock the time is read from it    #
+    # (event-driven front ends), otherwise one call is one iteration.                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def tick(self):
+        if self.clock is not None:
+            self.currentIteration = self.clock()
+        else:
+            self.currentIteration += 1
+
+    # ################################################################################################################ #
+    # getNextTimerDeadline()                                                                                           #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Returns the earliest time at which a retransmission timer or a held ACK is due, or None when nothing is pending  #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getNextTimerDeadline(self):
+        deadline = self.timers.getNextDeadline()
+        if self.ackOwed:
+            ackDeadline = self.ackOwedSince + self.maxAckDelay
+            deadline = ackDeadline if deadline is None else min(deadline, ackDeadline)
+        return deadline
 
     # ################################################################################################################ #
     # processSend()                                                                                                    #
@@ -123,28 +386,12 @@ class RDTLayer(object):
     def processSend(self):
 
         # ############################################################################################################ #
-        print('processSend(): ')
-        if self.dataToSend:
-            for i in range(RDTLayer.FLOW_CONTROL_WIN_SIZE//4):
-                # Make sure the number of bytes that have been sent to server is always less than Flow Control Window Size
-                if self.seqnum >= len(self.dataToSend) or (self.unacked * RDTLayer.DATA_LENGTH) > (RDTLayer.FLOW_CONTROL_WIN_SIZE - RDTLayer.DATA_LENGTH):
-                    break
-                self.unacked += 1
-                segmentSend = Segment()
-                seqnum = self.seqnum
-                windowEnd = min(self.seqnum + RDTLayer.DATA_LENGTH, len(self.dataToSend))
-                data = self.dataToSend[seqnum: windowEnd]
-                seqnum += RDTLayer.DATA_LENGTH
-                segmentSend.setData(seqnum, data)
-                # Display sending segment
-                print("Sending segment: ", segmentSend.to_string())
-
-                # Use the unreliable sendChannel to send the segment
-                self.sendChannel.send(segmentSend)
-                self.seqnum += RDTLayer.DATA_LENGTH
-
-                # Add segment to dictionary and set timer [timer, segment]
-                self.sendBuff[seqnum] = [2, segmentSend]
+        if self.source is not None:
+            self.source.release(self.getSendBase())
+        while self.canSendSegment():
+            self.sendSegment()
+        if self.closing and self.finOffset is None and not self.isSendPending() and not self.isSendOpen():
+            self.sendFin()
 
     # ################################################################################################################ #
     # processReceive()                                                                                                 #
@@ -158,75 +405,561 @@ class RDTLayer(object):
 
         # This call returns a list of incoming segments (see Segment class)...
         listIncomingSegments = self.receiveChannel.receive()
+        pendingAcks = []                                # ACKs owed for the data segments of this batch
         for seg in listIncomingSegments:
             # drop packet if there is a checksum error
             if not seg.checkChecksum():
-                print('Checksum error, packet dropped')
+                if self.tracer.events:
+                    self.tracer.record(self.currentIteration, tracing.CHECKSUM_DROP, seg.seqnum, seg.acknum,
+                                       len(seg.payload), self.connId)
+                continue
+
+            # Compressed stream: the first segment of it to arrive, data or repair, sets up the decompressor
+            if seg.compressed and self.decompressor is None:
+                self.decompressor = StreamDecompressor()
+
+            # Repair segment: never acknowledged, it may rebuild a lost data segment
+            if seg.repair:
+                if self.fecDecoder is None:
+                    self.fecDecoder = FecDecoder()
+                self.fecDecoder.addRepair(seg.seqnum, seg.payload, self.receiveSeqnum)
+                recovered = self.recoverLost()
+                if recovered and self.cumulativeAck:
+                    pendingAcks.append(self.buildAck(None))
+                elif recovered:
+                    pendingAcks.extend(self.buildAck(end) for end in recovered)
+                if recovered and self.checkReceiveComplete():
+                    self.sendFinAck()
+                continue
+
+            # Acknowledgment, alone or riding on reverse data
+            if seg.acknum >= 0:
+                if self.tracer.events:
+                    self.tracer.record(self.currentIteration, tracing.ACK_RECEIVE, -1, seg.acknum, 0, self.connId)
+                # ignore the window of an ACK overtaken by a newer one
+                if seg.window >= 0 and (not self.cumulativeAck or seg.acknum >= self.lastAck):
+                    self.peerWindow = seg.window
+                if self.cumulativeAck:
+                    acked = self.releaseAcked(seg.acknum, seg.sackBlocks)
+                    self.checkDuplicateAck(seg.acknum, bool(seg.payload) or seg.fin)
+                elif seg.acknum in self.sendBuff:
+                    segment, sentIteration, retransmitted = self.sendBuff.pop(seg.acknum)
+                    del self.sendEnds[bisect_left(self.sendEnds, seg.acknum)]
+                    self.timers.cancel(seg.acknum)
+                    self.unacked -= 1
+                    acked = 1
+                    if not retransmitted:
+                        self.sampleRtt(self.currentIteration - sentIteration)
+                else:
+                    acked = 0
+                if acked:
+                    self.congestionControl.onAck(acked, self.currentIteration)
+                    self.finRetries = 0                 # the peer is alive, only unanswered FINs count
+
+            # FIN (it has a seqnum, the end of the peer's data) or the FIN-ACK answering ours
+            if seg.fin:
+                if seg.seqnum < 0:
+                    if self.finOffset is not None and seg.acknum >= self.finOffset and not self.sendComplete:
+                        self.completeSend()
+                else:
+                    self.peerFinOffset = seg.seqnum
+                    self.checkReceiveComplete()
+                    # answered every time, the previous FIN-ACK may have been lost
+                    if self.receiveComplete:
+                        self.sendFinAck()
                 continue
 
-            # Server
-            if seg.acknum == -1:
-                segmentAck = Segment()  # Segment acknowledging packet(s) received
-                expected = self.seqnum + RDTLayer.DATA_LENGTH
+            # Data
+            if seg.seqnum >= 0:
+                self.peerSending = True
+                # segments may differ in size, the payload length gives the start offset
+                start = seg.seqnum - len(seg.payload)
+                # gaps and filled holes are acknowledged at once so the sender sees them, in-order data may wait
+                immediate = start > self.receiveSeqnum or bool(self.receiveBuff)
+                dropped = False
                 # if not expected next segment, add to buffer
-                if seg.seqnum != expected:
-                    print("out of order")
+                if start != self.receiveSeqnum:
+                    if self.tracer.events:
+                        self.tracer.record(self.currentIteration, tracing.OUT_OF_ORDER, seg.seqnum, -1,
+                                           len(seg.payload), self.connId)
                     # Check if the sequence number is in the receive buffer and is greater than current received to eliminate duplicates
-                    if seg.seqnum not in [s[0] for s in self.receiveBuff] and seg.seqnum > self.seqnum:
-                        self.receiveBuff.append((seg.seqnum, seg.payload))
+                    if seg.seqnum > self.receiveSeqnum and start not in self.receiveBuff:
+                        # drop what does not fit the advertised window, the sender will retransmit it
+                        if self.receiveBuff.size + len(seg.payload) > self.receiveBufferSize:
+                            dropped = True
+                            if self.tracer.events:
+                                self.tracer.record(self.currentIteration, tracing.BUFFER_DROP, seg.seqnum, -1,
+                                                   len(seg.payload), self.connId)
+                        else:
+                            self.receiveBuff.insert(start, seg.seqnum, seg.payload)
                 else:
-                    self.received += seg.payload
-                    self.seqnum = seg.seqnum
-                acknum = seg.seqnum
-                segmentAck.setAck(acknum)
-                print("Sending ack: ", segmentAck.to_string())
-                self.sendChannel.send(segmentAck)
-
-            # Client
+                    self.deliver(seg.payload)
+                    self.receiveSeqnum = seg.seqnum
+                    # a filled hole may make buffered segments deliverable, so the ACK covers them too
+                    if self.receiveBuff:
+                        self.buildData()
+                # this segment may complete a block whose repair arrived before it
+                if self.fecDecoder is not None and self.fecDecoder.repairs:
+                    for end in self.recoverLost():
+                        immediate = True
+                        if not self.cumulativeAck:
+                            pendingAcks.append(self.buildAck(end))
+                if self.delayedAck and self.cumulativeAck and not immediate:
+                    if not self.ackOwed:
+                        self.ackOwedSince = self.currentIteration
+                    self.ackOwed += 1
+                    if self.ackEvery and self.ackOwed >= self.ackEvery:
+                        pendingAcks.append(self.buildAck(None))
+                        self.ackOwed = 0
+                elif self.cumulativeAck or not dropped:
+                    # an ACK of this very segment would release it at the sender, so a dropped one gets none
+                    pendingAcks.append(self.buildAck(seg.seqnum))
+                # the data the peer's FIN announced may be complete now
+                if self.peerFinOffset is not None and self.checkReceiveComplete():
+                    self.sendFinAck()
+
+        if self.ackOwed:
+            if pendingAcks:
+                # an ACK goes out anyway, bring the last one up to date so it covers the coalesced data too
+                pendingAcks[-1] = self.buildAck(None)
+            elif self.currentIteration - self.ackOwedSince >= self.maxAckDelay:
+                pendingAcks.append(self.buildAck(None))
+        if pendingAcks:
+            self.sendAcks(pendingAcks)
+
+        #  resend packet if its timer ran out:
+        expired = self.timers.advance(self.currentIteration)
+        if RDTLayer.FIN_TIMER in expired:
+            expired.remove(RDTLayer.FIN_TIMER)
+            if self.sendBuff:
+                self.sendFin()                          # data still in flight is retransmitted for as long as it takes
+            elif self.finRetries < self.maxFinRetries:
+                self.finRetries += 1
+                self.sendFin()
             else:
-                print("Ack received: ", seg.acknum)
-                if seg.acknum in self.sendBuff:
-                    del self.sendBuff[seg.acknum]
-                    self.unacked -= 1
+                self.abandonFin()
+        if expired:
+            # back off once per iteration, however many segments expired together
+            if self.adaptiveTimeout:
+                self.rto = min(self.rto * 2, self.maxTimeout)
+            self.congestionControl.onTimeout(self.unacked, self.currentIteration)
+            self.recover = self.seqnum
+            for seg in expired:
+                self.retransmit(seg)
+                self.countSegmentTimeouts += 1
 
-        # fill what is possible
-        if self.receiveBuff:
-            print("Current Sequence: ", self.seqnum)
-            self.buildData()
+    def canSendSegment(self) -> bool:
+        """
+        Returns True if a new data segment may be sent now.
+        """
+        if self.seqnum >= self.getSendLimit():
+            return False
+        # The congestion window bounds the segments in flight and the receiver's advertised window bounds how far past
+        # the oldest unacknowledged character we may send. One segment may always be in flight so a stale zero window
+        # cannot stall the transfer.
+        if self.unacked >= self.congestionControl.getWindow():
+            return False
+        if self.unacked and self.seqnum + self.dataLength > self.getSendBase() + self.peerWindow:
+            return False
+        # Nagle: a short segment waits for the data in flight to be acknowledged, unless nothing more can follow it
+        if self.nagle and self.unacked and self.isSendOpen() and self.getSendLimit() - self.seqnum < self.dataLength:
+            return False
+        return True
 
-        #  count down and resend packet if lost:
-        if self.sendBuff:
-            for seg in self.sendBuff.keys():
-                self.sendBuff[seg][0] -= 1
-                time, segment = self.sendBuff[seg]
-
-                # create new segment and retransmit. New segment needed in case of checksum errors.
-                if time == 0:
-                    begin = seg - RDTLayer.DATA_LENGTH
-                    segmentSend = Segment()
-                    windowEnd = seg
-                    data = self.dataToSend[begin:windowEnd]
-                    segmentSend.setData(seg, data)
-                    self.sendChannel.send(segmentSend)
-                    self.sendBuff[seg] = [3, segmentSend]
-                    self.countSegmentTimeouts += 1
+    def sendSegment(self) -> None:
+        """
+        Sends the next data segment and sets its timer. Returns None.
+        """
+        self.unacked += 1
+        segmentSend = self.newSegment()
+        data = self.getSendData(self.seqnum, self.seqnum + self.dataLength)
+        if self.payloadLimit is not None and isinstance(data, str):
+            data = self.fitPayload(data)
+        seqnum = self.seqnum + len(data)
+        self.setSegmentData(segmentSend, seqnum, data)
+        if self.tracer.events:
+            self.tracer.record(self.currentIteration, tracing.SEND, seqnum, segmentSend.acknum, len(data), self.connId)
+
+        # Use the unreliable sendChannel to send the segment
+        self.sendChannel.send(segmentSend)
+        self.seqnum = seqnum
+
+        # Add segment to dictionary [segment, sentIteration, retransmitted] and set its timer
+        self.sendBuff[seqnum] = [segmentSend, self.currentIteration, False]
+        self.sendEnds.append(seqnum)
+        self.timers.schedule(seqnum, self.currentIteration + self.getTimeout(False))
+
+        if self.fecEncoder is not None:
+            self.fecEncoder.observe(False)
+            repair = self.fecEncoder.add(data)
+            # the last block of the data is closed early rather than waiting for segments that will not come
+            if repair is None and not self.isSendPending() and not self.isSendOpen():
+                repair = self.fecEncoder.flush()
+            if repair is not None:
+                self.sendRepair(repair)
+
+    def sendRepair(self, repair) -> None:
+        """
+        Sends the repair segment of the block ending at the current seqnum. It
+        has no timer and is never retransmitted. Returns None.
+        """
+        segmentRepair = self.newSegment()
+        segmentRepair.compressed = isinstance(self.source, CompressedSource)
+        segmentRepair.setRepair(self.seqnum, repair)
+        if self.tracer.events:
+            self.tracer.record(self.currentIteration, tracing.FEC_REPAIR, self.seqnum, -1, len(repair), self.connId)
+        self.sendChannel.send(segmentRepair)
+
+    def sendFin(self) -> None:
+        """
+        Sends (or sends again) the FIN after the last data segment, closing
+        an open FEC block first, and sets its timer, backed off once per
+        retransmission. Returns None.
+        """
+        if self.finOffset is None:
+            if self.fecEncoder is not None:
+                repair = self.fecEncoder.flush()
+                if repair is not None:
+                    self.sendRepair(repair)
+            self.finOffset = self.seqnum
+        segmentFin = self.newSegment()
+        segmentFin.fin = True
+        self.setSegmentData(segmentFin, self.finOffset, '')
+        if self.tracer.events:
+            self.tracer.record(self.currentIteration, tracing.FIN_SEND, self.finOffset, segmentFin.acknum, 0,
+                               self.connId)
+        self.sendChannel.send(segmentFin)
+        timeout = min(self.getTimeout(True) << self.finRetries, self.maxTimeout)
+        self.timers.schedule(RDTLayer.FIN_TIMER, self.currentIteration + timeout)
+
+    def sendFinAck(self) -> None:
+        """
+        Acknowledges the peer's FIN, and with it all of its data. Returns None.
+        """
+        segmentAck = self.newSegment()
+        segmentAck.fin = True
+        segmentAck.setAck(self.receiveSeqnum, window=self.receiveBufferSize - self.receiveBuff.size)
+        self.ackOwed = 0
+        if self.tracer.events:
+            self.tracer.record(self.currentIteration, tracing.FIN_ACK_SEND, -1, self.receiveSeqnum, 0, self.connId)
+        self.sendChannel.send(segmentAck)
+
+    def completeSend(self) -> None:
+        """
+        Marks the sending side done once the FIN is acknowledged and drops
+        what is left of the send buffer and its timers. Returns None.
+        """
+        self.sendComplete = True
+        self.dropSendState()
+        if self.completionCallback is not None:
+            self.completionCallback('send')
+
+    def abandonFin(self) -> None:
+        """
+        Gives up on a peer that acknowledged all our data but left
+        maxFinRetries retransmissions of the FIN unanswered: the sending side
+        stops without being complete. Returns None.
+        """
+        self.finAbandoned = True
+        self.dropSendState()
+        if self.completionCallback is not None:
+            self.completionCallback('abort')
+
+    def dropSendState(self) -> None:
+        """
+        Cancels the timers of the send buffer and the FIN and empties the
+        buffer. Returns None.
+        """
+        for seqnum in self.sendBuff:
+            self.timers.cancel(seqnum)
+        self.sendBuff.clear()
+        self.sendEnds.clear()
+        self.unacked = 0
+        self.timers.cancel(RDTLayer.FIN_TIMER)
+
+    def checkReceiveComplete(self) -> bool:
+        """
+        Marks the receiving side done once everything up to the peer's FIN
+        is delivered. Returns True if this call completed it.
+        """
+        if self.receiveComplete or self.peerFinOffset is None or self.receiveSeqnum < self.peerFinOffset:
+            return False
+        self.receiveComplete = True
+        if self.completionCallback is not None:
+            self.completionCallback('receive')
+        return True
+
+    def fitPayload(self, data):
+        """
+        Returns the longest prefix of a text payload whose UTF-8 encoding,
+        as the channel sends it, fits the channel's byte limit.
+        """
+        if len(data) * 4 <= self.payloadLimit:         # no character takes more than 4 bytes
+            return data
+        encoded = data.encode('utf-8', 'surrogatepass')
+        if len(encoded) <= self.payloadLimit:
+            return data
+        end = self.payloadLimit
+        while encoded[end] & 0xC0 == 0x80:              # back up to the first byte of a character
+            end -= 1
+        return data[:len(encoded[:end].decode('utf-8', 'surrogatepass'))]
+
+    def setSegmentData(self, segment, seqnum, data) -> None:
+        """
+        Fills a data segment. Once the peer is sending too, the cumulative ACK,
+        SACK blocks and receive window ride along. Returns None.
+        """
+        segment.compressed = isinstance(self.source, CompressedSource)
+        if self.peerSending and self.cumulativeAck:
+            self.ackOwed = 0
+            segment.setData(seqnum, data, self.receiveSeqnum, self.receiveBuff.getBlocks(RDTLayer.MAX_SACK_BLOCKS),
+                            self.receiveBufferSize - self.receiveBuff.size)
+        else:
+            segment.setData(seqnum, data)
+
+    def buildAck(self, seqnum):
+        """
+        Returns the standalone ACK segment for the data segment ending at
+        seqnum, or for everything received so far when seqnum is None. With
+        cumulative ACKs it always covers everything received.
+        """
+        segmentAck = self.newSegment()  # Segment acknowledging packet(s) received
+        window = self.receiveBufferSize - self.receiveBuff.size
+        if self.cumulativeAck:
+            segmentAck.setAck(self.receiveSeqnum, self.receiveBuff.getBlocks(RDTLayer.MAX_SACK_BLOCKS), window)
+        else:
+            segmentAck.setAck(seqnum, window=window)
+        return segmentAck
+
+    def sendAcks(self, pendingAcks) -> None:
+        """
+        Acknowledges the data segments of one receive batch. With cumulative
+        ACKs, new data segments the windows allow carry the latest ACK and
+        replace the standalone ones; the legacy per-segment ACKs are always
+        standalone. Returns None.
+        """
+        if self.cumulativeAck:
+            piggybacked = 0
+            while piggybacked < len(pendingAcks) and self.canSendSegment():
+                self.sendSegment()
+                piggybacked += 1
+            if piggybacked:
+                return
+        self.ackOwed = 0
+        for segmentAck in pendingAcks:
+            if self.tracer.events:
+                self.tracer.record(self.currentIteration, tracing.ACK_SEND, -1, segmentAck.acknum, 0, self.connId)
+            self.sendChannel.send(segmentAck)
+
+    def newSegment(self):
+        """
+        Returns an empty segment of the configured class for this connection.
+        """
+        segment = self.segmentClass()
+        segment.connId = self.connId
+        return segment
+
+    def retransmit(self, seqnum, event=tracing.RETRANSMIT) -> None:
+        """
+        Sends the segment ending at seqnum again and restarts its timer.
+        Returns None.
+        """
+        if self.fecEncoder is not None:
+            self.fecEncoder.observe(True)
+        # create new segment and retransmit. New segment needed in case of checksum errors.
+        begin = seqnum - len(self.sendBuff[seqnum][0].payload)
+        segmentSend = self.newSegment()
+        self.setSegmentData(segmentSend, seqnum, self.getSendData(begin, seqnum))
+        if self.tracer.events:
+            self.tracer.record(self.currentIteration, event, seqnum, -1, len(segmentSend.payload), self.connId)
+        self.sendChannel.send(segmentSend)
+        self.sendBuff[seqnum] = [segmentSend, self.currentIteration, True]
+        self.timers.schedule(seqnum, self.currentIteration + self.getTimeout(True))
+
+    def getTimeout(self, retransmission) -> int:
+        """
+        Returns the number of iterations to wait for an ACK before the
+        segment being sent is retransmitted.
+        """
+        if not self.adaptiveTimeout:
+            return RDTLayer.FIXED_RETRANSMIT_TIMEOUT if retransmission else RDTLayer.FIXED_TIMEOUT
+        return math.ceil(self.rto)
+
+    def sampleRtt(self, rtt) -> None:
+        """
+        Folds one round trip measurement (in iterations) into the smoothed
+        RTT and RTT variance and recomputes the retransmission timeout.
+        Returns None.
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + max(1, 4 * self.rttvar), self.minTimeout), self.maxTimeout)
+
+    def checkDuplicateAck(self, acknum, carriesData=False) -> None:
+        """
+        Counts repeated cumulative ACK numbers and retransmits the first
+        unacknowledged segment once the duplicate threshold is reached. ACKs
+        riding on data segments are not duplicates. Returns None.
+        """
+        if acknum > self.lastAck:
+            self.lastAck = acknum
+            self.dupAcks = 0
+        elif acknum == self.lastAck and self.sendBuff and not carriesData:
+            self.dupAcks += 1
+            if self.fastRetransmit and self.dupAcks == self.dupAckThreshold:
+                seqnum = next(iter(self.sendBuff))
+                self.retransmit(seqnum, tracing.FAST_RETRANSMIT)
+                # cut the window once per window of data, not once per lost segment
+                if seqnum > self.recover:
+                    self.congestionControl.onLoss(self.unacked, self.currentIteration)
+                    self.recover = self.seqnum
+                self.countFastRetransmits += 1
 
     def buildData(self) -> None:
         """
         Takes the receiving buffer current buffer of out of order or missing
         segments and fills and rebuilds what is possible. Returns None.
         """
-        self.receiveBuff.sort()
-        next = self.seqnum + RDTLayer.DATA_LENGTH
-        processed = 0
-        for data in self.receiveBuff:
-            if data[0] == next:
-                # print("--------------Expected: ", next)
-                self.received += data[1]
-                self.seqnum = next
-                next += RDTLayer.DATA_LENGTH
-                processed += 1
-            else:
-                continue
-        for i in range(processed):
-            del self.receiveBuff[0]
+        for seqnum, payload in self.receiveBuff.drain(self.receiveSeqnum):
+            self.deliver(payload)
+            self.receiveSeqnum = seqnum
+
+    def recoverLost(self) -> list:
+        """
+        Rebuilds the lost data segments the stored repair segments allow,
+        buffers them and delivers what became in order. Returns the end
+        offsets of the rebuilt segments.
+        """
+        recovered = []
+        for start, end, payload in self.fecDecoder.recover(self.receiveSeqnum, self.receiveBuff):
+            if self.tracer.events:
+                self.tracer.record(self.currentIteration, tracing.FEC_RECOVER, end, -1, len(payload), self.connId)
+            self.receiveBuff.insert(start, end, payload)
+            recovered.append(end)
+        if recovered:
+            self.countFecRecoveries += len(recovered)
+            self.buildData()
+        return recovered
+
+    def deliver(self, payload) -> None:
+        """
+        Appends in-order payload to the received data, decompressed first
+        when the peer compresses. Binary payloads are written at their offset
+        in a preallocated bytearray. Returns None.
+        """
+        if self.fecDecoder is not None:
+            self.fecDecoder.delivered(self.receiveSeqnum, payload)
+        if self.decompressor is not None:
+            payload = self.decompressor.decompress(payload)
+            if not payload:
+                return
+        self.deliveredLength += len(payload)
+        if self.sink is not None:
+            self.sink(payload)
+            return
+        if isinstance(payload, str):
+            self.received += payload
+            return
+        if self.receivedBytes is None:
+            self.receivedBytes = bytearray(self.receiveCapacity)
+        end = self.receivedLength + len(payload)
+        if end > len(self.receivedBytes):
+            # grow into a fresh buffer: views handed out by getDataReceived() pin the old one
+            grown = bytearray(max(end, 2 * len(self.receivedBytes)))
+            grown[:self.receivedLength] = memoryview(self.receivedBytes)[:self.receivedLength]
+            self.receivedBytes = grown
+        self.receivedBytes[self.receivedLength:end] = payload
+        self.receivedLength = end
+
+    def getCompressionStats(self) -> dict:
+        """
+        Returns the compression ratio, data lengths and CPU time of what this
+        layer sent ('send') and received ('receive'), None for a direction
+        that was not compressed.
+        """
+        stats = {'send': None, 'receive': None}
+        for direction, codec in (('send', getattr(self.source, 'compressor', None)), ('receive', self.decompressor)):
+            if codec is not None:
+                stats[direction] = {'ratio': codec.getRatio(), 'rawLength': codec.rawLength,
+                                    'compressedLength': codec.compressedLength, 'cpuTime': codec.cpuTime}
+        return stats
+
+    def getSendLimit(self) -> int:
+        """
+        Returns the end offset of the data available to send. A stream is
+        read ahead by at most one segment.
+        """
+        if self.source is not None:
+            return self.source.available(self.seqnum + self.dataLength)
+        return len(self.dataToSend)
+
+    def getSendData(self, begin, end):
+        """
+        Returns the data to send between offsets begin and end, cut short at
+        the end of the data.
+        """
+        if self.source is not None:
+            return self.source.slice(begin, end)
+        return self.dataToSend[begin:end]
+
+    def isSendOpen(self) -> bool:
+        """
+        Returns True if more data may still be added to what there is to send.
+        """
+        if self.source is not None:
+            return not self.source.eof
+        return self.appendable
+
+    def isSendPending(self) -> bool:
+        """
+        Returns True while there is data that has not been sent yet.
+        """
+        return self.seqnum < self.getSendLimit()
+
+    def getSendBase(self) -> int:
+        """
+        Returns the offset of the oldest unacknowledged character.
+        """
+        if self.sendBuff:
+            seqnum, entry = next(iter(self.sendBuff.items()))
+            return seqnum - len(entry[0].payload)
+        return self.seqnum
+
+    def releaseAcked(self, acknum, sackBlocks) -> int:
+        """
+        Removes every send buffer entry covered by a cumulative ACK number
+        and its selective-ACK ranges. Returns the number of entries removed.
+        """
+        released = self.unacked
+        # Karn's rule: only segments that were never retransmitted give an RTT sample
+        newestSent = -1
+        # sendBuff is filled in seqnum order, so covered entries sit at the front
+        covered = bisect_right(self.sendEnds, acknum)
+        for seqnum in self.sendEnds[:covered]:
+            segment, sentIteration, retransmitted = self.sendBuff.pop(seqnum)
+            self.timers.cancel(seqnum)
+            if not retransmitted:
+                newestSent = max(newestSent, sentIteration)
+        del self.sendEnds[:covered]
+        for left, right in sackBlocks:
+            # segments vary in size: the first entry ending past left may start before it and is not covered
+            first = bisect_right(self.sendEnds, left)
+            if first < len(self.sendEnds):
+                seqnum = self.sendEnds[first]
+                if seqnum - len(self.sendBuff[seqnum][0].payload) < left:
+                    first += 1
+            last = bisect_right(self.sendEnds, right)
+            for seqnum in self.sendEnds[first:last]:
+                segment, sentIteration, retransmitted = self.sendBuff.pop(seqnum)
+                self.timers.cancel(seqnum)
+                if not retransmitted:
+                    newestSent = max(newestSent, sentIteration)
+            del self.sendEnds[first:last]
+        self.unacked = len(self.sendBuff)
+        if newestSent >= 0:
+            self.sampleRtt(self.currentIteration - newestSent)
+        return released - self.unacked
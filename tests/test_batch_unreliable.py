@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from segment import Segment
+from unreliable import UnreliableChannel
+
+np = pytest.importorskip("numpy")
+from batch_unreliable import BatchUnreliableChannel  # noqa: E402
+
+COUNTERS = ('countTotalDataPackets', 'countSentPackets', 'countChecksumErrorPackets', 'countDroppedPackets',
+            'countDelayedPackets', 'countOutOfOrderPackets', 'countAckPackets')
+
+
+def segments(iteration):
+    data = Segment()
+    data.setData(4 * iteration, 'data')
+    ack = Segment()
+    ack.setAck(4 * iteration)
+    return [data, ack]
+
+
+def run(channel, iterations=30):
+    """
+    Sends one data and one ACK segment per iteration. Returns the
+    (iteration, seqnum, acknum, payload) of everything delivered.
+    """
+    received = []
+    for iteration in range(1, iterations + 1):
+        for seg in segments(iteration):
+            channel.send(seg)
+        channel.processData()
+        received += [(iteration, seg.seqnum, seg.acknum, seg.payload) for seg in channel.receive()]
+    return received
+
+
+def counters(channel):
+    return {name: getattr(channel, name) for name in COUNTERS}
+
+
+def test_seeded_runs_are_reproducible():
+    results = []
+    for attempt in range(2):
+        random.seed(5)                                  # createChecksumError() picks the character to corrupt
+        channel = BatchUnreliableChannel(True, True, True, True, seed=42)
+        results.append((run(channel), counters(channel)))
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize('ratios', [
+    dict(ratioDelayedPackets=1.0),                      # delayed packets are not counted as data or ACKs
+    dict(ratioDroppedPackets=1.0, ratioDataErrorPackets=1.0),   # dropped data is still corrupted and counted
+    dict(ratioDataErrorPackets=1.0),
+    dict(ratioOutOfOrderPackets=1.0),
+])
+def test_counters_match_unreliable_channel(ratios):
+    # with every ratio 0 or 1 both channels make the same decisions, whatever the random draws
+    options = dict(dict(ratioDroppedPackets=0.0, ratioDelayedPackets=0.0, ratioDataErrorPackets=0.0,
+                        ratioOutOfOrderPackets=0.0), **ratios)
+    reference = UnreliableChannel(True, True, True, True, **options)
+    batch = BatchUnreliableChannel(True, True, True, True, seed=1, **options)
+    referenceReceived = [entry[:3] for entry in run(reference)]
+    batchReceived = [entry[:3] for entry in run(batch)]
+    assert counters(batch) == counters(reference)
+    assert batchReceived == referenceReceived
+
+
+def test_delayed_packets_are_released_on_schedule():
+    channel = BatchUnreliableChannel(False, False, True, False, seed=3, ratioDelayedPackets=1.0,
+                                     iterationsToDelayPackets=5)
+    delayed = Segment()
+    delayed.setData(4, 'late')
+    channel.send(delayed)
+    channel.processData()
+    assert channel.receive() == [] and channel.countDelayedPackets == 1 and channel.countTotalDataPackets == 0
+
+    channel.ratioDelayedPackets = 0.0
+    arrivals = []
+    for iteration in range(2, 10):
+        filler = Segment()
+        filler.setAck(iteration)
+        channel.send(filler)
+        channel.processData()
+        if delayed in channel.receive():
+            arrivals.append(iteration)
+    assert arrivals == [6]                              # sent at iteration 1, held for 5 iterations
+
+
+def test_needs_numpy(monkeypatch):
+    import batch_unreliable
+    monkeypatch.setattr(batch_unreliable, 'np', None)
+    with pytest.raises(ValueError):
+        BatchUnreliableChannel(False, False, False, False)
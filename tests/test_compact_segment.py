@@ -0,0 +1,77 @@
+import struct
+
+from compact_segment import CompactSegment
+from segment import Segment
+
+
+def roundTrip(seg):
+    decoded = CompactSegment.decode(seg.encode())
+    assert decoded.checkChecksum()
+    return decoded
+
+
+def test_data_segment_round_trip():
+    seg = CompactSegment()
+    seg.connId = 7
+    seg.setData(42, 'héllo 😀', ack=12, sackBlocks=[(20, 30), (40, 44)], window=512)
+    decoded = roundTrip(seg)
+    assert (decoded.connId, decoded.seqnum, decoded.acknum, decoded.window) == (7, 42, 12, 512)
+    assert decoded.payload == 'héllo 😀'
+    assert decoded.sackBlocks == ((20, 30), (40, 44))
+    assert not (decoded.repair or decoded.compressed or decoded.fin)
+
+
+def test_flags_and_binary_payload_round_trip():
+    seg = CompactSegment()
+    seg.compressed = True
+    seg.setRepair(64, b'\x00\xffparity')
+    decoded = roundTrip(seg)
+    assert decoded.repair and decoded.compressed and not decoded.fin
+    assert decoded.payload == b'\x00\xffparity'
+
+    finAck = CompactSegment()
+    finAck.fin = True
+    finAck.setAck(99, window=0)
+    decoded = roundTrip(finAck)
+    assert decoded.fin and decoded.seqnum == -1 and decoded.acknum == 99 and decoded.payload == ''
+
+
+def test_encode_into_a_reused_buffer():
+    buffer = bytearray(256)
+    seg = CompactSegment()
+    seg.setData(3, 'abc')
+    length = seg.encodeInto(buffer, 10)
+    assert length == seg.getEncodedSize()
+    assert CompactSegment.decode(buffer[10:10 + length]).payload == 'abc'
+
+
+def test_from_segment_keeps_every_field():
+    seg = Segment()
+    seg.connId = 3
+    seg.fin = True
+    seg.setData(8, 'data', ack=2, sackBlocks=[(12, 16)], window=64)
+    decoded = roundTrip(CompactSegment.fromSegment(seg))
+    assert (decoded.connId, decoded.seqnum, decoded.acknum, decoded.window, decoded.fin) == (3, 8, 2, 64, True)
+    assert decoded.payload == 'data' and decoded.sackBlocks == ((12, 16),)
+
+
+def test_crc_rejects_corruption():
+    seg = CompactSegment()
+    seg.setData(16, 'payload', ack=4, sackBlocks=[(20, 24)])
+    wire = seg.encode()
+    for position in range(len(wire)):
+        corrupted = bytearray(wire)
+        corrupted[position] ^= 0x20
+        try:
+            decoded = CompactSegment.decode(corrupted)
+        except (struct.error, ValueError):
+            continue                                    # counts that run past the datagram: no segment at all
+        assert not decoded.checkChecksum(), position
+
+    # unreadable UTF-8 in a text payload and unknown flag bits are kept, so the checksum still fails
+    corrupted = bytearray(wire)
+    corrupted[-1] = 0xff
+    assert not CompactSegment.decode(corrupted).checkChecksum()
+
+    seg.createChecksumError()
+    assert not seg.checkChecksum()
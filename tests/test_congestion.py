@@ -0,0 +1,51 @@
+import pytest
+
+from congestion import CongestionControl, CubicCongestionControl, FixedWindow, RenoCongestionControl
+
+
+def test_fixed_window_never_moves():
+    engine = FixedWindow(3)
+    engine.onAck(3, 1)
+    engine.onLoss(3, 2)
+    engine.onTimeout(3, 3)
+    assert engine.getWindow() == 3
+
+
+def test_reno_window():
+    engine = RenoCongestionControl()
+    engine.onAck(2, 1)                                  # slow start: one segment per segment acknowledged
+    assert engine.getWindow() == 6
+    engine.onLoss(6, 2)
+    assert engine.ssthresh == 3 and engine.getWindow() == 3
+    engine.onAck(3, 3)                                  # congestion avoidance: one segment per window
+    assert engine.cwnd == 4
+    engine.onTimeout(4, 4)
+    assert engine.ssthresh == 2 and engine.getWindow() == 1
+
+
+def test_cubic_window():
+    engine = CubicCongestionControl()
+    engine.onAck(4, 1)
+    assert engine.getWindow() == 8
+    engine.onLoss(8, 2)
+    assert engine.wMax == 8 and engine.getWindow() == 5
+    # concave growth back to the window of the loss, then convex past it
+    windows = []
+    for now in range(3, 20):
+        engine.onAck(engine.getWindow(), now)
+        windows.append(engine.cwnd)
+    assert windows == sorted(windows)
+    assert windows[0] < 8 < windows[-1]
+    engine.onTimeout(engine.getWindow(), 20)
+    assert engine.getWindow() == 1 and engine.ssthresh == windows[-1] * CubicCongestionControl.BETA
+
+
+def test_an_incomplete_engine_cannot_be_created():
+    class AckOnly(CongestionControl):
+        def onAck(self, ackedSegments, now) -> None:
+            self.cwnd += ackedSegments
+
+    with pytest.raises(TypeError):
+        AckOnly()
+    with pytest.raises(TypeError):
+        CongestionControl()
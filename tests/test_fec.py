@@ -0,0 +1,65 @@
+from fec import FecDecoder, FecEncoder
+from reassembly import ReassemblyBuffer
+
+
+def deliverBlock(payloads, lost, start=0):
+    """
+    Encodes one block, delivers every payload but the lost one and returns
+    what the decoder rebuilds.
+    """
+    encoder = FecEncoder(blockSize=len(payloads), adaptive=False)
+    repair = None
+    for payload in payloads:
+        repair = encoder.add(payload)
+    assert repair is not None
+
+    decoder = FecDecoder()
+    buffer = ReassemblyBuffer()
+    receiveSeqnum = start
+    offset = start
+    for index, payload in enumerate(payloads):
+        end = offset + len(payload)
+        if index != lost:
+            if offset == receiveSeqnum:
+                decoder.delivered(offset, payload)
+                receiveSeqnum = end
+            else:
+                buffer.insert(offset, end, payload)
+        offset = end
+    decoder.addRepair(offset, repair, receiveSeqnum)
+    return decoder.recover(receiveSeqnum, buffer)
+
+
+def test_rebuilds_a_lost_binary_segment():
+    payloads = [b'abcd', b'ef', b'ghijk', b'\x00\x00\x01']
+    for lost in range(len(payloads)):
+        start = sum(len(payload) for payload in payloads[:lost])
+        assert deliverBlock(payloads, lost, 100) == [(100 + start, 100 + start + len(payloads[lost]), payloads[lost])]
+
+
+def test_rebuilds_a_lost_text_segment():
+    payloads = ['héllo', 'wörld', '😀!', 'abc']
+    assert deliverBlock(payloads, 2) == [(10, 12, '😀!')]
+    assert deliverBlock(payloads, 0) == [(0, 5, 'héllo')]
+
+
+def test_two_losses_are_not_rebuilt():
+    encoder = FecEncoder(blockSize=3, adaptive=False)
+    for payload in (b'aa', b'bb'):
+        encoder.add(payload)
+    repair = encoder.add(b'cc')
+    decoder = FecDecoder()
+    buffer = ReassemblyBuffer()
+    buffer.insert(4, 6, b'cc')
+    decoder.addRepair(6, repair, 0)
+    assert decoder.recover(0, buffer) == []
+    assert decoder.countRecovered == 0
+
+
+def test_repair_of_a_received_block_is_ignored():
+    decoder = FecDecoder()
+    encoder = FecEncoder(blockSize=2, adaptive=False)
+    encoder.add(b'ab')
+    repair = encoder.add(b'cd')
+    decoder.addRepair(4, repair, 4)
+    assert decoder.repairs == {}
@@ -0,0 +1,125 @@
+import random
+
+from channels import ListChannel
+from multiplex import RDTMultiplexer
+from rdt_layer import RDTLayer
+from segment import Segment
+from unreliable import UnreliableChannel
+
+
+def lossyChannel():
+    return UnreliableChannel(True, True, True, True, ratioDroppedPackets=0.3)
+
+
+def run(client, server, channels, received, maxIterations):
+    for i in range(maxIterations):
+        client.processData()
+        channels[0].processData()
+        server.processData()
+        channels[1].processData()
+        for connId, flow in server.flows.items():
+            if flow.layer.isReceiveComplete():
+                received[connId] = flow.layer.getDataReceived()
+        if not client.flows and not server.flows:
+            return i
+    raise AssertionError("flows still open after {0} iterations".format(maxIterations))
+
+
+def test_flows_close_under_loss_without_zombies():
+    random.seed(7)
+    clientToServer, serverToClient = lossyChannel(), lossyChannel()
+    # a short linger so that retransmitted FINs and data reach closed flows
+    client = RDTMultiplexer(clientToServer, serverToClient, closeCompleted=True, linger=1)
+    server = RDTMultiplexer(serverToClient, clientToServer, acceptFlows=True, closeCompleted=True, linger=1,
+                            autoClose=True)
+    texts = {}
+    for n in range(30):
+        layer = client.openFlow()
+        texts[layer.connId] = 'flow {0} '.format(n) * 30
+        layer.setDataToSend(texts[layer.connId])
+
+    received = {}
+    run(client, server, (clientToServer, serverToClient), received, 20000)
+    assert received == texts
+    assert client.countCompletedFlows + client.countAbortedFlows == 30
+    assert server.countCompletedFlows == 30
+    assert client.countTimeWaitSegments and server.countTimeWaitSegments
+
+    # the closed flows still count in the aggregate
+    statistics = server.getAggregateStatistics()
+    assert statistics['flows'] == 0 and statistics['completedFlows'] == 30
+    assert statistics['bytesDelivered'] == sum(len(text) for text in texts.values())
+    assert statistics['throughput'] > 0
+    assert client.getAggregateStatistics()['segmentTimeouts'] > 0
+
+    # late retransmissions land in TIME_WAIT and reopen nothing
+    for i in range(RDTMultiplexer.TIME_WAIT):
+        client.processData()
+        clientToServer.processData()
+        server.processData()
+        serverToClient.processData()
+    assert not server.flows and not client.flows
+
+
+def test_time_wait_answers_fin_and_refuses_the_id():
+    channel = ListChannel()
+    server = RDTMultiplexer(channel, acceptFlows=True, closeCompleted=True, linger=0)
+    fin = Segment()
+    fin.connId = 5
+    fin.fin = True
+    fin.setData(0, '')
+    channel.incoming.append(fin)
+    server.processData()
+    server.getLayer(5).close()
+    while 5 in server.flows:
+        if channel.sent and channel.sent[-1].fin and channel.sent[-1].seqnum >= 0:
+            ack = Segment()
+            ack.connId = 5
+            ack.fin = True
+            ack.setAck(channel.sent[-1].seqnum)
+            channel.incoming.append(ack)
+        server.processData()
+    assert any(seg.fin and seg.seqnum < 0 for seg in channel.sent)
+
+    # the peer retransmits its FIN: answered with a FIN-ACK, the flow stays closed
+    channel.sent.clear()
+    channel.incoming.append(fin)
+    server.processData()
+    assert 5 not in server.flows
+    assert [(seg.connId, seg.fin, seg.acknum) for seg in channel.sent] == [(5, True, 0)]
+    assert server.countTimeWaitSegments == 1
+
+    # once TIME_WAIT is over the id may be opened again
+    for i in range(server.timeWait):
+        server.processData()
+    channel.incoming.append(fin)
+    server.processData()
+    assert 5 in server.flows
+
+
+def test_fin_retransmissions_are_capped():
+    channel = ListChannel()
+    layer = RDTLayer(maxFinRetries=3)
+    layer.setSendChannel(channel)
+    layer.setReceiveChannel(channel)
+    events = []
+    layer.setCompletionCallback(events.append)
+    layer.setDataToSend('')
+    for i in range(200):
+        layer.processData()
+    fins = [seg for seg in channel.sent if seg.fin]
+    assert len(fins) == 4
+    assert layer.finAbandoned and layer.isClosed() and not layer.isComplete()
+    assert events == ['abort']
+
+
+def test_fin_is_not_given_up_while_data_is_in_flight():
+    channel = ListChannel()
+    layer = RDTLayer(maxFinRetries=1)
+    layer.setSendChannel(channel)
+    layer.setReceiveChannel(channel)
+    layer.setDataToSend('unacked')
+    for i in range(500):
+        layer.processData()
+    assert layer.sendBuff and layer.finOffset is not None
+    assert not layer.finAbandoned and not layer.isClosed()
@@ -0,0 +1,190 @@
+import random
+
+from channels import ListChannel, ackSegment, attach, dataSegment
+from congestion import FixedWindow
+from rdt_layer import RDTLayer
+
+
+def test_segment_dropped_for_the_window_is_not_acknowledged():
+    server = RDTLayer(cumulativeAck=False, receiveBufferSize=12, dataLength=10)
+    channel = attach(server)
+    # both out of order; the second does not fit the window once the first is buffered
+    channel.incoming += [dataSegment(12, 'abcd'), dataSegment(24, 'x' * 10)]
+    server.processData()
+    assert [seg.acknum for seg in channel.take()] == [12]
+    assert 8 in server.receiveBuff and 14 not in server.receiveBuff
+
+    # retransmitted once the window has room, it is buffered and acknowledged
+    channel.incoming.append(dataSegment(8, 'abcdefgh'))
+    server.processData()
+    channel.take()
+    channel.incoming.append(dataSegment(24, 'x' * 10))
+    server.processData()
+    assert [seg.acknum for seg in channel.take()] == [24]
+
+
+def test_sack_releases_out_of_order_entries():
+    sender = RDTLayer()
+    channel = attach(sender)
+    sender.write('abcdefghijklmnop')
+    sender.processData()
+    assert [seg.seqnum for seg in channel.take()] == [4, 8, 12, 16]
+    # the segment ending at 4 is lost, the next two arrived
+    channel.incoming.append(ackSegment(0, [(4, 12)]))
+    sender.processData()
+    assert list(sender.sendBuff) == [4, 16] and sender.unacked == 2
+    # a block covering only part of a segment does not release it
+    channel.incoming.append(ackSegment(0, [(4, 12), (14, 16)]))
+    sender.processData()
+    assert list(sender.sendBuff) == [4, 16]
+    channel.incoming.append(ackSegment(16))
+    sender.processData()
+    assert not sender.sendBuff and sender.unacked == 0
+
+
+def test_sack_blocks_match_a_reference_with_varied_segment_sizes():
+    rng = random.Random(3)
+    for trial in range(200):
+        sender = RDTLayer(congestionControl=FixedWindow(64))
+        channel = attach(sender)
+        sender.write('x' * 400)
+        segments = {}                                   # end -> start
+        while sender.isSendPending():
+            sender.dataLength = rng.randrange(1, 9)
+            start = sender.seqnum
+            sender.sendSegment()
+            segments[sender.seqnum] = start
+        acknum = rng.choice([0] + list(segments))
+        blocks = []
+        for n in range(rng.randrange(4) if acknum < sender.seqnum else 0):
+            left = rng.randrange(acknum, sender.seqnum)
+            blocks.append((left, rng.randrange(left + 1, sender.seqnum + 1)))
+        expected = [end for end, start in segments.items()
+                    if end > acknum and not any(left <= start and end <= right for left, right in blocks)]
+        released = sender.releaseAcked(acknum, blocks)
+        assert list(sender.sendBuff) == sender.sendEnds == expected
+        assert released == len(segments) - len(expected) and sender.unacked == len(expected)
+        assert len(sender.timers) == len(expected)
+
+
+def test_karn_rule_takes_no_sample_from_a_retransmission():
+    sender = RDTLayer()
+    channel = attach(sender)
+    sender.write('abcd')
+    sender.processData()
+    channel.incoming.append(ackSegment(4))
+    sender.processData()
+    sender.processData()
+    assert sender.srtt == 1
+
+    sender = RDTLayer()
+    channel = attach(sender)
+    sender.write('abcd')
+    sender.processData()
+    while not sender.sendBuff[4][2]:                    # wait for the timeout to retransmit it
+        sender.processData()
+    assert sender.countSegmentTimeouts == 1
+    channel.incoming.append(ackSegment(4))
+    sender.processData()
+    assert not sender.sendBuff and sender.srtt is None
+
+
+def test_third_duplicate_ack_retransmits():
+    sender = RDTLayer()
+    channel = attach(sender)
+    sender.write('abcdefghijklmnop')
+    sender.processData()
+    channel.take()
+    # the segment ending at 8 is lost: the ACK of 4, then duplicates for the segments after the hole
+    channel.incoming += [ackSegment(4), ackSegment(4, [(8, 12)]), ackSegment(4, [(8, 16)])]
+    sender.processData()
+    assert sender.dupAcks == 2 and sender.countFastRetransmits == 0
+    assert not [seg for seg in channel.take() if seg.seqnum == 8]
+    channel.incoming.append(ackSegment(4, [(8, 16)]))
+    sender.processData()
+    assert sender.countFastRetransmits == 1
+    assert [seg.seqnum for seg in channel.take()] == [8]
+
+
+def test_receive_window_limits_the_sender():
+    sender = RDTLayer()
+    channel = attach(sender)
+    sender.write('x' * 32)
+    sender.processData()
+    assert [seg.seqnum for seg in channel.take()] == [4, 8, 12, 16]
+    # the receiver holds 8 characters past the oldest unacknowledged one, 12 to 16 are already in flight
+    channel.incoming.append(ackSegment(4, window=8))
+    sender.processData()
+    sender.processData()
+    assert channel.take() == []
+    channel.incoming.append(ackSegment(16, window=8))
+    sender.processData()
+    sender.processData()
+    assert [seg.seqnum for seg in channel.take()] == [20, 24]
+    # a zero window still lets one segment through once nothing is in flight
+    channel.incoming.append(ackSegment(24, window=0))
+    sender.processData()
+    sender.processData()
+    assert [seg.seqnum for seg in channel.take()] == [28]
+
+
+def test_data_carries_the_ack_instead_of_a_standalone_one():
+    layer = RDTLayer()
+    channel = attach(layer)
+    layer.write('x' * 32)
+    layer.processData()
+    assert len(channel.take()) == 4
+    # the ACK opens the window, so the ACK for the peer's data rides on the next data segment
+    channel.incoming += [ackSegment(4), dataSegment(4, 'wxyz')]
+    layer.processData()
+    assert [(seg.seqnum, seg.acknum) for seg in channel.take()] == [(20, 4)]
+
+    # with nothing to send the ACK goes out on its own
+    layer = RDTLayer()
+    channel = attach(layer)
+    channel.incoming.append(dataSegment(4, 'wxyz'))
+    layer.processData()
+    assert [(seg.seqnum, seg.acknum) for seg in channel.take()] == [(-1, 4)]
+
+
+def test_one_coalesced_ack_per_round():
+    segments = [dataSegment(end, 'abcd') for end in range(4, 24, 4)]
+    receiver = RDTLayer(ackEvery=None)
+    channel = attach(receiver)
+    channel.incoming += segments
+    receiver.processData()
+    assert [seg.acknum for seg in channel.take()] == [20]
+    receiver.processData()
+    assert channel.take() == []
+
+    # every second segment is acknowledged, the last ACK is brought up to date
+    receiver = RDTLayer(ackEvery=2)
+    channel = attach(receiver)
+    channel.incoming += segments
+    receiver.processData()
+    assert [seg.acknum for seg in channel.take()] == [8, 20]
+
+
+def test_zlib_round_trip_and_stats():
+    text = 'compressible text, héllo ' * 200
+    client, server = RDTLayer(compression='zlib', dataLength=64), RDTLayer(dataLength=64)
+    toServer, toClient = ListChannel(), ListChannel()
+    client.setSendChannel(toServer)
+    client.setReceiveChannel(toClient)
+    server.setSendChannel(toClient)
+    server.setReceiveChannel(toServer)
+    client.setDataToSend(text)
+    for i in range(100):
+        client.processData()
+        toServer.incoming += toServer.take()
+        server.processData()
+        toClient.incoming += toClient.take()
+        if client.isComplete() and server.isComplete():
+            break
+    assert server.getDataReceived() == text and server.getReceivedLength() == len(text)
+
+    sent, received = client.getCompressionStats()['send'], server.getCompressionStats()['receive']
+    assert sent['rawLength'] == received['rawLength'] == len(text)
+    assert sent['compressedLength'] == received['compressedLength'] == client.seqnum
+    assert sent['ratio'] > 10 and sent['cpuTime'] >= 0
+    assert client.getCompressionStats()['receive'] is None and server.getCompressionStats()['send'] is None
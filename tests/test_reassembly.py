@@ -0,0 +1,57 @@
+import random
+
+from reassembly import ReassemblyBuffer
+
+
+def test_segments_merge_into_runs():
+    buffer = ReassemblyBuffer()
+    assert buffer.insert(10, 14, 'cccc')
+    assert buffer.insert(20, 24, 'eeee')
+    assert buffer.insert(6, 10, 'bbbb')                 # extends the run starting at 10 to the left
+    assert buffer.insert(14, 20, 'dddddd')              # joins both runs
+    assert buffer.blockStarts == {6: 24}
+    assert buffer.blockEnds == {24: 6}
+    assert buffer.getBlocks(4) == [(6, 24)]
+    assert not buffer.insert(10, 14, 'cccc')            # duplicate
+    assert buffer.size == 18
+
+
+def test_blocks_are_most_recent_first():
+    buffer = ReassemblyBuffer()
+    buffer.insert(10, 12, 'aa')
+    buffer.insert(20, 22, 'bb')
+    buffer.insert(30, 32, 'cc')
+    buffer.insert(12, 14, 'dd')
+    assert buffer.getBlocks(4) == [(10, 14), (30, 32), (20, 22)]
+    assert buffer.getBlocks(2) == [(10, 14), (30, 32)]
+
+
+def test_drain_returns_a_run_in_order():
+    buffer = ReassemblyBuffer()
+    buffer.insert(4, 8, 'bbbb')
+    buffer.insert(8, 12, 'cccc')
+    buffer.insert(16, 20, 'eeee')
+    assert list(buffer.drain(0)) == []
+    assert list(buffer.drain(4)) == [(8, 'bbbb'), (12, 'cccc')]
+    assert buffer.blockStarts == {16: 20}
+    assert len(buffer) == 1 and 16 in buffer and buffer.get(16) == 'eeee'
+    assert buffer.size == 4
+
+
+def test_runs_match_a_reference_model():
+    rng = random.Random(3)
+    bounds = list(range(0, 400, 4))
+    segments = list(zip(bounds, bounds[1:]))
+    rng.shuffle(segments)
+    buffer = ReassemblyBuffer()
+    covered = set()
+    for start, end in segments[:60]:
+        buffer.insert(start, end, 'x' * (end - start))
+        covered.update(range(start, end))
+        runs = {}
+        for offset in sorted(covered):
+            if offset - 1 not in covered:
+                left = offset
+            runs[left] = offset + 1
+        assert buffer.blockStarts == runs
+        assert buffer.blockEnds == {right: left for left, right in runs.items()}
@@ -0,0 +1,65 @@
+import random
+
+from timer_wheel import TimerWheel
+
+
+def test_matches_a_reference_model():
+    rng = random.Random(11)
+    wheel = TimerWheel()
+    reference = {}                                      # key -> deadline
+    now = 0
+    for step in range(3000):
+        action = rng.random()
+        if action < 0.5:
+            key = rng.randrange(200)
+            # mostly short timeouts, some far enough out to sit in the coarser levels and cascade down
+            distance = rng.choice((rng.randrange(1, 70), rng.randrange(1, 5000), rng.randrange(1, 300000)))
+            wheel.schedule(key, now + distance)
+            reference[key] = now + distance
+        elif action < 0.6 and reference:
+            key = rng.choice(list(reference))
+            wheel.cancel(key)
+            del reference[key]
+        else:
+            now += rng.choice((1, 1, 1, 7, 64, 700, 5000))
+            expired = wheel.advance(now)
+            due = {key for key, deadline in reference.items() if deadline <= now}
+            assert sorted(expired) == sorted(due)
+            for key in due:
+                del reference[key]
+        assert len(wheel) == len(reference)
+        assert set(wheel.timers) == set(reference)
+
+
+def test_expired_keys_come_earliest_first():
+    wheel = TimerWheel()
+    wheel.schedule('late', 5000)
+    wheel.schedule('early', 3)
+    wheel.schedule('middle', 100)
+    assert wheel.advance(10000) == ['early', 'middle', 'late']
+
+
+def test_cascaded_timer_fires_on_its_deadline():
+    wheel = TimerWheel(now=10)
+    wheel.schedule('key', 10 + 4100)                    # two levels up
+    tick = 10
+    while True:
+        deadline = wheel.getNextDeadline()
+        assert deadline is not None and deadline > tick
+        tick = deadline
+        expired = wheel.advance(tick)
+        if expired:
+            break
+    assert expired == ['key'] and tick == 4110
+    assert wheel.getNextDeadline() is None
+
+
+def test_reschedule_and_overdue():
+    wheel = TimerWheel()
+    wheel.schedule(1, 50)
+    wheel.schedule(1, 20)
+    wheel.advance(10)
+    wheel.schedule(2, 5)                                # already overdue: fires on the next tick
+    assert wheel.advance(11) == [2]
+    assert wheel.advance(20) == [1]
+    assert wheel.advance(100) == []
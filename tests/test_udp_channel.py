@@ -0,0 +1,87 @@
+from compact_segment import CompactSegment
+from rdt_layer import RDTLayer
+from udp_channel import UdpChannel, createUdpChannelPair
+from unreliable import UnreliableChannel
+
+
+def transfer(data, maxIterations=10000, **layerOptions):
+    first, second = createUdpChannelPair()
+    try:
+        client = RDTLayer(**layerOptions)
+        server = RDTLayer(**layerOptions)
+        client.setSendChannel(first)
+        client.setReceiveChannel(first)
+        server.setSendChannel(second)
+        server.setReceiveChannel(second)
+        client.setDataToSend(data)
+        for i in range(maxIterations):
+            client.processData()
+            server.processData()
+            if server.isReceiveComplete():
+                break
+        return server.getDataReceived(), first
+    finally:
+        first.close()
+        second.close()
+
+
+def test_non_ascii_text_segments_fit_one_datagram():
+    data = 'é' * 200000
+    received, channel = transfer(data, dataLength=100000)
+    assert received == data
+    assert channel.countSendErrors == 0
+    assert len(channel.sendBuffer) == UdpChannel.MAX_DATAGRAM_SIZE
+
+
+def test_mixed_width_text_over_udp():
+    data = ('a€😀é' * 40000)[:150001]
+    received, channel = transfer(data, dataLength=100000)
+    assert received == data
+
+
+def test_fit_payload_cuts_at_a_character_boundary():
+    layer = RDTLayer(dataLength=100000)
+    layer.payloadLimit = 10
+    assert layer.fitPayload('abcdefghij') == 'abcdefghij'
+    assert layer.fitPayload('aaaaaaaa😀') == 'aaaaaaaa'
+    assert layer.fitPayload('ééééééé') == 'ééééé'
+    assert layer.fitPayload('\ud800' * 4) == '\ud800' * 3
+
+
+def test_impairment_ratios_are_per_channel():
+    lossy, clean = createUdpChannelPair(impairment=True, ratioDroppedPackets=1.0, ratioDelayedPackets=0.0,
+                                        ratioDataErrorPackets=0.0)
+    try:
+        clean.ratioDroppedPackets = 0.0
+        for seqnum in range(1, 11):
+            seg = CompactSegment()
+            seg.setData(seqnum, 'x')
+            lossy.send(seg)
+            clean.send(seg)
+        assert lossy.countDroppedPackets == 10 and lossy.countSentPackets == 0
+        assert clean.countDroppedPackets == 0 and clean.countSentPackets == 10
+        assert UnreliableChannel.RATIO_DROPPED_PACKETS == 0.1
+    finally:
+        lossy.close()
+        clean.close()
+
+
+def test_malformed_datagrams_are_dropped():
+    first, second = createUdpChannelPair()
+    try:
+        seg = CompactSegment()
+        seg.setData(4, 'abcd')
+        wire = seg.encode()
+        first.transmit(wire[:10])                       # shorter than the header
+        first.transmit(wire[:-2])                       # payload cut short
+        first.transmit(wire)
+        segments = []
+        for i in range(100):
+            segments += second.receive()
+            if segments:
+                break
+        assert [received.payload for received in segments] == ['abcd']
+        assert second.countMalformedPackets == 2
+    finally:
+        first.close()
+        second.close()
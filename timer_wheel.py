@@ -0,0 +1,142 @@
+# #################################################################################################################### #
+# TimerWheel                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Hierarchical timing wheel for retransmission deadlines. Each level has SLOTS buckets covering SLOTS times the span   #
+# of the level below it. A timer is placed once in the level that covers its distance from now and is moved to a finer #
+# level only when that level's bucket comes due, so a tick touches just the timers that fire (plus the occasional      #
+# cascade) instead of every outstanding segment.                                                                       #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Time is an integer tick (RDTLayer iterations by default). Buckets are dicts keyed by the timer key, so cancelling a  #
+# timer is O(1). Buckets are only allocated when first used.                                                           #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class TimerWheel(object):
+    SLOT_BITS = 6
+    SLOTS = 1 << SLOT_BITS                              # buckets per level
+    LEVELS = 4                                          # covers SLOTS ** LEVELS ticks ahead
+
+    def __init__(self, now=0):
+        self.current = now                              # last tick processed
+        self.wheels = [[None] * TimerWheel.SLOTS for i in range(TimerWheel.LEVELS)]
+        self.timers = {}                                # key -> (deadline, level, slot)
+        self.counts = [0] * TimerWheel.LEVELS           # armed timers per level
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def schedule(self, key, deadline) -> None:
+        """
+        Arms the timer for key to fire at deadline, replacing any earlier
+        deadline for the same key. Overdue deadlines fire on the next tick.
+        Returns None.
+        """
+        if key in self.timers:
+            self.cancel(key)
+        self.place(key, max(deadline, self.current + 1))
+
+    def cancel(self, key) -> None:
+        """
+        Disarms the timer for key if it is armed. Returns None.
+        """
+        entry = self.timers.pop(key, None)
+        if entry is not None:
+            deadline, level, slot = entry
+            del self.wheels[level][slot][key]
+            self.counts[level] -= 1
+
+    def advance(self, now) -> list:
+        """
+        Moves the wheel forward to tick now. Returns the keys whose deadline
+        has been reached, earliest first.
+        """
+        expired = []
+        while self.current < now:
+            if not self.timers:
+                self.current = now                      # nothing armed, skip the idle ticks
+                break
+            # with the finer levels empty nothing happens before the next coarser bucket comes due, so jump there
+            level = 0
+            while level < TimerWheel.LEVELS - 1 and self.counts[level] == 0:
+                level += 1
+            if level:
+                span = 1 << (TimerWheel.SLOT_BITS * level)
+                boundary = (self.current // span + 1) * span
+                if boundary > now:
+                    self.current = now
+                    break
+                self.current = boundary - 1
+            self.current += 1
+            tick = self.current
+            # pull the buckets that come due at this tick down to the finer levels, coarsest first
+            for level in range(TimerWheel.LEVELS - 1, 0, -1):
+                if tick & ((1 << (TimerWheel.SLOT_BITS * level)) - 1) == 0:
+                    self.cascade(level, (tick >> (TimerWheel.SLOT_BITS * level)) & (TimerWheel.SLOTS - 1))
+            slot = tick & (TimerWheel.SLOTS - 1)
+            bucket = self.wheels[0][slot]
+            if bucket:
+                self.wheels[0][slot] = None
+                self.counts[0] -= len(bucket)
+                for key in bucket:
+                    del self.timers[key]
+                    expired.append(key)
+        return expired
+
+    def getNextDeadline(self):
+        """
+        Returns the earliest tick at which advance() may have work to do (a
+        timer firing or a bucket cascading), or None if nothing is armed.
+        """
+        if not self.timers:
+            return None
+        nextTick = None
+        if self.counts[0]:
+            for tick in range(self.current + 1, self.current + TimerWheel.SLOTS + 1):
+                if self.wheels[0][tick & (TimerWheel.SLOTS - 1)]:
+                    nextTick = tick
+                    break
+        for level in range(1, TimerWheel.LEVELS):
+            if self.counts[level]:
+                span = 1 << (TimerWheel.SLOT_BITS * level)
+                boundary = (self.current // span + 1) * span
+                if nextTick is None or boundary < nextTick:
+                    nextTick = boundary
+                break
+        return nextTick
+
+    def cascade(self, level, slot) -> None:
+        """
+        Re-places every timer of one bucket relative to the current tick.
+        Returns None.
+        """
+        bucket = self.wheels[level][slot]
+        if bucket:
+            self.wheels[level][slot] = None
+            self.counts[level] -= len(bucket)
+            for key, deadline in bucket.items():
+                self.place(key, deadline)
+
+    def place(self, key, deadline) -> None:
+        """
+        Puts a timer in the bucket of the finest level that spans its
+        deadline. Returns None.
+        """
+        delta = deadline - self.current
+        level = 0
+        while level < TimerWheel.LEVELS - 1 and delta >= 1 << (TimerWheel.SLOT_BITS * (level + 1)):
+            level += 1
+        # beyond the wheel's range: park it in the farthest bucket and re-place it when that comes due
+        parked = min(deadline, self.current + (1 << (TimerWheel.SLOT_BITS * TimerWheel.LEVELS)) - 1)
+        slot = (parked >> (TimerWheel.SLOT_BITS * level)) & (TimerWheel.SLOTS - 1)
+        bucket = self.wheels[level][slot]
+        if bucket is None:
+            bucket = self.wheels[level][slot] = {}
+        bucket[key] = deadline
+        self.timers[key] = (deadline, level, slot)
+        self.counts[level] += 1
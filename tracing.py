@@ -0,0 +1,169 @@
+import json
+from collections import deque
+
+
+# #################################################################################################################### #
+# Tracer                                                                                                               #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Instrumentation for RDTLayer. At DEBUG every segment event (send, retransmit, ACK, out of order arrival, drop) is    #
+# written into a fixed-size ring buffer, at INFO and above the layer adds one sample of its counters (in flight,       #
+# buffered, retransmits, RTT, RTO, cwnd) per iteration. Samples export as Prometheus text or JSON lines.               #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# The layer tests tracer.events / tracer.sampling before building any event, so a disabled tracer costs one attribute  #
+# check per call site. The ring is allocated on the first event. One tracer may be shared by several layers (a         #
+# multiplexer's flows), events and samples carry the connection id. With console=True events are also printed, which   #
+# is what rdt_main.py uses for its step-by-step output.                                                                #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+OFF = 0
+INFO = 1
+DEBUG = 2
+
+# event kinds
+SEND = 'send'
+RETRANSMIT = 'retransmit'
+FAST_RETRANSMIT = 'fast_retransmit'
+ACK_SEND = 'ack_send'
+ACK_RECEIVE = 'ack_receive'
+OUT_OF_ORDER = 'out_of_order'
+CHECKSUM_DROP = 'checksum_drop'
+BUFFER_DROP = 'buffer_drop'
+FEC_REPAIR = 'fec_repair'
+FEC_RECOVER = 'fec_recover'
+FIN_SEND = 'fin_send'
+FIN_ACK_SEND = 'fin_ack_send'
+
+CONSOLE_LABELS = {
+    SEND: "Sending segment: ",
+    RETRANSMIT: "Retransmitting segment: ",
+    FAST_RETRANSMIT: "Fast retransmit: ",
+    ACK_SEND: "Sending ack: ",
+    ACK_RECEIVE: "Ack received: ",
+    OUT_OF_ORDER: "Out of order: ",
+    CHECKSUM_DROP: "Checksum error, packet dropped: ",
+    BUFFER_DROP: "Receive buffer full, packet dropped: ",
+    FEC_REPAIR: "Sending repair segment: ",
+    FEC_RECOVER: "Rebuilt lost segment: ",
+    FIN_SEND: "Sending FIN: ",
+    FIN_ACK_SEND: "Sending FIN-ACK: ",
+}
+
+# sample field -> (Prometheus metric, type, help)
+PROMETHEUS_METRICS = {
+    'inFlight': ('rdt_in_flight_segments', 'gauge', "Segments sent and not acknowledged"),
+    'buffered': ('rdt_buffered_bytes', 'gauge', "Out of order data held by the receiver"),
+    'timeouts': ('rdt_segment_timeouts_total', 'counter', "Retransmissions after a timer ran out"),
+    'fastRetransmits': ('rdt_fast_retransmits_total', 'counter', "Retransmissions after duplicate ACKs"),
+    'fecRecoveries': ('rdt_fec_recoveries_total', 'counter', "Lost segments rebuilt from repair segments"),
+    'srtt': ('rdt_srtt_iterations', 'gauge', "Smoothed round trip time"),
+    'rto': ('rdt_rto_iterations', 'gauge', "Retransmission timeout"),
+    'cwnd': ('rdt_cwnd_segments', 'gauge', "Congestion window"),
+    'peerWindow': ('rdt_peer_window_bytes', 'gauge', "Receive window advertised by the peer"),
+    'received': ('rdt_received_bytes', 'counter', "In-order data delivered"),
+}
+
+
+class Tracer(object):
+    __slots__ = ('level', 'events', 'sampling', 'console', 'capacity', 'ring', 'position', 'samples',
+                 'eventCounts')
+
+    RING_SIZE = 4096                                    # Segment events kept, oldest are overwritten
+    SAMPLE_SIZE = 4096                                  # Per-iteration samples kept
+
+    def __init__(self, level=OFF, capacity=RING_SIZE, sampleCapacity=SAMPLE_SIZE, console=False):
+        self.capacity = capacity
+        self.console = console
+        self.ring = None
+        self.position = 0                               # events recorded so far, the ring index is position % capacity
+        self.samples = deque(maxlen=sampleCapacity)
+        self.eventCounts = {}
+        self.setLevel(level)
+
+    def setLevel(self, level) -> None:
+        self.level = level
+        self.events = level >= DEBUG
+        self.sampling = level >= INFO
+
+    def record(self, iteration, kind, seqnum, acknum, length, connId=0) -> None:
+        """
+        Stores one segment event in the ring buffer. Returns None.
+        """
+        if self.ring is None:
+            self.ring = [None] * self.capacity
+        self.ring[self.position % self.capacity] = (iteration, connId, kind, seqnum, acknum, length)
+        self.position += 1
+        self.eventCounts[kind] = self.eventCounts.get(kind, 0) + 1
+        if self.console:
+            print("{0}seq: {1}, ack: {2}, len: {3}".format(CONSOLE_LABELS[kind], seqnum, acknum, length))
+
+    def getEvents(self) -> list:
+        """
+        Returns the buffered events, oldest first, as
+        (iteration, connId, kind, seqnum, acknum, length) tuples.
+        """
+        if self.ring is None:
+            return []
+        if self.position <= self.capacity:
+            return self.ring[:self.position]
+        start = self.position % self.capacity
+        return self.ring[start:] + self.ring[:start]
+
+    def sample(self, layer) -> None:
+        """
+        Appends the current counters of layer to the samples. Returns None.
+        """
+        self.samples.append({
+            'iteration': layer.currentIteration,
+            'connId': layer.connId,
+            'inFlight': layer.unacked,
+            'buffered': layer.receiveBuff.size,
+            'timeouts': layer.countSegmentTimeouts,
+            'fastRetransmits': layer.countFastRetransmits,
+            'fecRecoveries': layer.countFecRecoveries,
+            'srtt': layer.srtt,
+            'rto': layer.rto,
+            'cwnd': layer.congestionControl.getWindow(),
+            'peerWindow': layer.peerWindow,
+            'received': layer.getReceivedLength(),
+        })
+
+    def exportJsonLines(self, file, events=False) -> int:
+        """
+        Writes every sample (and with events=True every buffered event) to
+        file as one JSON object per line. Returns the number of lines.
+        """
+        count = 0
+        for sample in self.samples:
+            file.write(json.dumps(sample) + '\n')
+            count += 1
+        if events:
+            for iteration, connId, kind, seqnum, acknum, length in self.getEvents():
+                file.write(json.dumps({'iteration': iteration, 'connId': connId, 'event': kind, 'seqnum': seqnum,
+                                       'acknum': acknum, 'length': length}) + '\n')
+                count += 1
+        return count
+
+    def exportPrometheus(self) -> str:
+        """
+        Returns the latest sample of every connection and the event totals in
+        the Prometheus text exposition format.
+        """
+        latest = {}
+        for sample in self.samples:
+            latest[sample['connId']] = sample
+        lines = []
+        for field, (metric, kind, text) in PROMETHEUS_METRICS.items():
+            lines.append("# HELP {0} {1}".format(metric, text))
+            lines.append("# TYPE {0} {1}".format(metric, kind))
+            for connId, sample in sorted(latest.items()):
+                if sample[field] is not None:
+                    lines.append('{0}{{conn="{1}"}} {2}'.format(metric, connId, sample[field]))
+        if self.eventCounts:
+            lines.append("# HELP rdt_events_total Segment events recorded at DEBUG level")
+            lines.append("# TYPE rdt_events_total counter")
+            for kind, count in sorted(self.eventCounts.items()):
+                lines.append('rdt_events_total{{kind="{0}"}} {1}'.format(kind, count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,163 @@
+import errno
+import random
+import socket
+import struct
+from collections import deque
+
+from compact_segment import CompactSegment
+from rdt_layer import RDTLayer
+from unreliable import UnreliableChannel
+
+
+# #################################################################################################################### #
+# UdpChannel                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# A real datagram transport with the send(seg)/receive() interface RDTLayer expects from UnreliableChannel. Segments   #
+# are serialized as CompactSegment wire bytes into one reused send buffer, and receive() drains every datagram waiting #
+# on the non-blocking socket into a pool of reused receive buffers, a recvmmsg-style batch per call.                   #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# One UdpChannel is one endpoint, so a layer uses the same channel for setSendChannel and setReceiveChannel. Segments  #
+# come back as CompactSegment whatever class was sent. createUdpChannelPair() returns two connected loopback channels. #
+# With impairment=True the sending side drops, delays and corrupts datagrams like UnreliableChannel, with the same     #
+# per-instance ratio arguments and its RATIO_* constants as defaults; call processData() once per iteration to release #
+# delayed datagrams.                                                                                                   #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class UdpChannel(object):
+    MAX_DATAGRAM_SIZE = 65507                           # largest UDP payload over IPv4
+    BATCH_SIZE = 64                                     # most datagrams drained by one receive()
+    SOCKET_BUFFER_SIZE = 4 * 1024 * 1024                # requested SO_RCVBUF / SO_SNDBUF
+    # largest payload that still fits one datagram with a full header, read by RDTLayer to cap its segment size
+    # (in bytes: RDTLayer cuts text segments by their UTF-8 size, non-ASCII text takes up to 4 bytes per character)
+    maxPayloadSize = MAX_DATAGRAM_SIZE - CompactSegment.HEADER.size \
+        - RDTLayer.MAX_SACK_BLOCKS * CompactSegment.SACK_BLOCK.size
+
+    def __init__(self, localAddress=('127.0.0.1', 0), remoteAddress=None, impairment=False,
+                 ratioDroppedPackets=UnreliableChannel.RATIO_DROPPED_PACKETS,
+                 ratioDelayedPackets=UnreliableChannel.RATIO_DELAYED_PACKETS,
+                 ratioDataErrorPackets=UnreliableChannel.RATIO_DATA_ERROR_PACKETS,
+                 iterationsToDelayPackets=UnreliableChannel.ITERATIONS_TO_DELAY_PACKETS):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, option, UdpChannel.SOCKET_BUFFER_SIZE)
+            except OSError:
+                pass                                    # keep the system default
+        self.sock.bind(localAddress)
+        self.sock.setblocking(False)
+        self.remoteAddress = remoteAddress
+        self.sendBuffer = bytearray(UdpChannel.MAX_DATAGRAM_SIZE)
+        self.receiveBuffers = [bytearray(UdpChannel.MAX_DATAGRAM_SIZE) for i in range(UdpChannel.BATCH_SIZE)]
+
+        # impairment shim, same model as UnreliableChannel
+        self.impairment = impairment
+        self.ratioDroppedPackets = ratioDroppedPackets
+        self.ratioDelayedPackets = ratioDelayedPackets
+        self.ratioDataErrorPackets = ratioDataErrorPackets
+        self.iterationsToDelayPackets = iterationsToDelayPackets
+        self.delayedPackets = deque()                   # (release iteration, datagram bytes), oldest first
+        self.currentIteration = 0
+
+        # stats
+        self.countTotalDataPackets = 0
+        self.countSentPackets = 0
+        self.countReceivedPackets = 0
+        self.countMalformedPackets = 0
+        self.countChecksumErrorPackets = 0
+        self.countDroppedPackets = 0
+        self.countDelayedPackets = 0
+        self.countAckPackets = 0
+        self.countSendErrors = 0
+        self.countBytesSent = 0
+        self.countBytesReceived = 0
+
+    def getAddress(self):
+        return self.sock.getsockname()
+
+    def connect(self, remoteAddress):
+        self.remoteAddress = remoteAddress
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def send(self, seg):
+        if not isinstance(seg, CompactSegment):
+            seg = CompactSegment.fromSegment(seg)
+        if seg.acknum == -1 or seg.payload:
+            self.countTotalDataPackets += 1
+        else:
+            self.countAckPackets += 1
+
+        if self.impairment:
+            if random.random() <= self.ratioDelayedPackets:
+                self.countDelayedPackets += 1
+                release = self.currentIteration + self.iterationsToDelayPackets
+                self.delayedPackets.append((release, bytes(seg.encode())))
+                return
+            if random.random() <= self.ratioDroppedPackets:
+                self.countDroppedPackets += 1
+                return
+            # only data packets can have checksum errors; corrupt a copy so the sender's segment stays intact
+            if (seg.acknum == -1 or seg.payload) and random.random() <= self.ratioDataErrorPackets:
+                corrupted = CompactSegment.decode(seg.encode())
+                corrupted.createChecksumError()
+                seg = corrupted
+                self.countChecksumErrorPackets += 1
+
+        length = seg.encodeInto(self.sendBuffer)
+        self.transmit(memoryview(self.sendBuffer)[:length])
+
+    def transmit(self, datagram):
+        """
+        Sends one serialized segment. A full socket buffer counts as a
+        dropped datagram, as it would on a real network.
+        """
+        try:
+            self.sock.sendto(datagram, self.remoteAddress)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS, errno.ECONNREFUSED):
+                raise
+            self.countSendErrors += 1
+            return
+        self.countSentPackets += 1
+        self.countBytesSent += len(datagram)
+
+    def receive(self):
+        segments = []
+        for buffer in self.receiveBuffers:
+            try:
+                length = self.sock.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionRefusedError:
+                continue                                # ICMP error from an earlier send, not a datagram
+            self.countReceivedPackets += 1
+            self.countBytesReceived += length
+            try:
+                segments.append(CompactSegment.decode(memoryview(buffer)[:length]))
+            except (struct.error, ValueError):
+                self.countMalformedPackets += 1         # shorter than its header says, not a segment
+        return segments
+
+    def processData(self):
+        self.currentIteration += 1
+        while self.delayedPackets and self.delayedPackets[0][0] <= self.currentIteration:
+            self.transmit(self.delayedPackets.popleft()[1])
+
+
+def createUdpChannelPair(host='127.0.0.1', impairment=False, **impairmentOptions):
+    """
+    Returns two UdpChannel endpoints on loopback that send to each other.
+    impairmentOptions (ratioDroppedPackets, ...) apply to both.
+    """
+    first = UdpChannel((host, 0), impairment=impairment, **impairmentOptions)
+    second = UdpChannel((host, 0), first.getAddress(), impairment=impairment, **impairmentOptions)
+    first.connect(second.getAddress())
+    return first, second